@@ -9,7 +9,7 @@ sampling_frequency = {{ sampling_frequency }}
 num_frames = {{ num_frames }}
 
 # Electrode coordinates
-electrode_coords = np.loadtxt(f"{experiment_dir}/electrode_coords.txt")
+electrode_coords = np.loadtxt(f"{experiment_dir}/electrode_coords.txt", dtype=np.float32)
 assert len(electrode_coords) == num_channels
 
 raw_path = f"{experiment_dir}/raw/{{ filename }}"
@@ -34,7 +34,7 @@ if False:
     from realtime512.figpack_realtime512.MEAMovie import MEAMovie
     raw_movie = MEAMovie(
         raw_data=filt,
-        electrode_coords=np.loadtxt(f"{experiment_dir}/electrode_coords.txt"),
+        electrode_coords=electrode_coords,
         start_time_sec=0,
         sampling_frequency_hz=sampling_frequency
     )
@@ -48,7 +48,7 @@ if False:
     from realtime512.figpack_realtime512.TemplatesView import TemplatesView
     templates_view = TemplatesView(
         templates=templates,
-        electrode_coords=np.loadtxt(f"{experiment_dir}/electrode_coords.txt")
+        electrode_coords=electrode_coords
     )
     templates_view.show(
         title="Templates",
@@ -1,3 +1,5 @@
+import { DatasetDataType } from "./figpack-interface";
+
 export type ZoomDirection = "in" | "out";
 export type PanDirection = "forward" | "back";
 const defaultZoomScaleFactor = 1.4;
@@ -193,3 +195,19 @@ export const panTimeDeltaT = (
   const panDisplacementSeconds = action.deltaT;
   return panTimeHelper(state, panDisplacementSeconds);
 };
+
+// Convert int16-quantized data (stored with a scale attribute) back to float32.
+// Data that was not quantized (scale undefined) is returned unchanged.
+export const dequantize = (
+  data: DatasetDataType,
+  scale: number | undefined,
+): Float32Array => {
+  if (scale === undefined) {
+    return data as Float32Array;
+  }
+  const out = new Float32Array(data.length);
+  for (let i = 0; i < data.length; i++) {
+    out[i] = data[i] * scale;
+  }
+  return out;
+};
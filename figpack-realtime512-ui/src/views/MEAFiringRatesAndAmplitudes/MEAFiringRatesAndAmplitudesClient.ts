@@ -1,4 +1,5 @@
 import { ZarrGroup } from "../../figpack-interface";
+import { dequantize } from "../../helpers";
 
 export class MEAFiringRatesAndAmplitudesClient {
   #zarrGroup: ZarrGroup;
@@ -57,9 +58,14 @@ export class MEAFiringRatesAndAmplitudesClient {
     if (!firingRatesDataset) {
       throw new Error("No mean_firing_rates dataset found");
     }
-    this.#meanFiringRates = (await firingRatesDataset.getData(
-      {},
-    )) as Float32Array;
+    const firingRatesData = await firingRatesDataset.getData({});
+    if (!firingRatesData) {
+      throw new Error("Failed to load mean_firing_rates");
+    }
+    this.#meanFiringRates = dequantize(
+      firingRatesData,
+      this.#zarrGroup.attrs["mean_firing_rates_scale"],
+    );
 
     // Load mean spike amplitudes (shape: num_frames x num_channels)
     const amplitudesDataset = await this.#zarrGroup.getDataset(
@@ -68,9 +74,14 @@ export class MEAFiringRatesAndAmplitudesClient {
     if (!amplitudesDataset) {
       throw new Error("No mean_spike_amplitudes dataset found");
     }
-    this.#meanSpikeAmplitudes = (await amplitudesDataset.getData(
-      {},
-    )) as Float32Array;
+    const amplitudesData = await amplitudesDataset.getData({});
+    if (!amplitudesData) {
+      throw new Error("Failed to load mean_spike_amplitudes");
+    }
+    this.#meanSpikeAmplitudes = dequantize(
+      amplitudesData,
+      this.#zarrGroup.attrs["mean_spike_amplitudes_scale"],
+    );
 
     // Calculate global max amplitude across all frames for consistent scaling
     this.#maxAmplitude = Math.max(...Array.from(this.#meanSpikeAmplitudes));
@@ -48,9 +48,7 @@ const TemplateView: React.FC<Props> = ({
         }
 
         // Get template data for this unit
-        const data = await client.templatesDataset.getData({
-          slice: [[unitIndex, unitIndex + 1]],
-        });
+        const data = await client.getTemplate(unitIndex);
 
         if (!data || data.length !== client.numChannels) {
           throw new Error(
@@ -58,7 +56,7 @@ const TemplateView: React.FC<Props> = ({
           );
         }
 
-        setTemplateData(data as Float32Array);
+        setTemplateData(data);
 
         // Get electrode coordinates and calculate electrode radius
         const electrodeCoords = await client.getElectrodeCoords();
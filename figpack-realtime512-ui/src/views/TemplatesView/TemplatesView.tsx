@@ -108,12 +108,9 @@ const TemplatesView: React.FC<Props> = ({ width, height, zarrGroup }) => {
 
       for (let unitIndex = 0; unitIndex < client.numTemplates; unitIndex++) {
         try {
-          const data = await client.templatesDataset.getData({
-            slice: [[unitIndex, unitIndex + 1]],
-          });
+          const templateData = await client.getTemplate(unitIndex);
 
-          if (data) {
-            const templateData = data as Float32Array;
+          if (templateData) {
             for (let i = 0; i < templateData.length; i++) {
               if (templateData[i] < gMin) gMin = templateData[i];
               if (templateData[i] > gMax) gMax = templateData[i];
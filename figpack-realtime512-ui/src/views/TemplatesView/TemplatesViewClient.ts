@@ -1,4 +1,5 @@
 import { ZarrDataset, ZarrGroup } from "../../figpack-interface";
+import { dequantize } from "../../helpers";
 
 export class TemplatesViewClient {
   #zarrGroup: ZarrGroup;
@@ -61,6 +62,14 @@ export class TemplatesViewClient {
     return this.#templatesDataset;
   }
 
+  async getTemplate(unitIndex: number): Promise<Float32Array | undefined> {
+    const data = await this.#templatesDataset.getData({
+      slice: [[unitIndex, unitIndex + 1]],
+    });
+    if (!data) return undefined;
+    return dequantize(data, this.#zarrGroup.attrs["templates_scale"]);
+  }
+
   async getElectrodeCoords(): Promise<number[][]> {
     if (this.#electrodeCoords === null) {
       const coordsDataset =
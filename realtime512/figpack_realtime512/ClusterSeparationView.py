@@ -1,6 +1,7 @@
 from typing import Union
 
 import numpy as np
+from numcodecs import Blosc
 
 import figpack
 from .figpack_realtime512_extension import figpack_realtime512_extension
@@ -34,8 +35,11 @@ class ClusterSeparationViewItem:
         """
         self.unit_id_1 = str(unit_id_1)
         self.unit_id_2 = str(unit_id_2)
-        self.projections_1 = np.array(projections_1, dtype=np.float32)
-        self.projections_2 = np.array(projections_2, dtype=np.float32)
+        # Integer form used when writing, so ids are not re-parsed per write
+        self._unit_id_1_int = int(unit_id_1)
+        self._unit_id_2_int = int(unit_id_2)
+        self.projections_1 = np.ascontiguousarray(projections_1, dtype=np.float32)
+        self.projections_2 = np.ascontiguousarray(projections_2, dtype=np.float32)
         
         # Validate
         if self.projections_1.ndim != 1:
@@ -87,28 +91,40 @@ class ClusterSeparationView(figpack.ExtensionView):
         # Store metadata
         group.attrs["num_items"] = self.num_items
 
-        # Build consolidated arrays
-        unit_ids_1 = []
-        unit_ids_2 = []
-        projection_starts_1 = [0]
-        projection_starts_2 = [0]
-        all_projections_1 = []
-        all_projections_2 = []
-        
-        for item in self.separation_items:
-            unit_ids_1.append(int(item.unit_id_1))
-            unit_ids_2.append(int(item.unit_id_2))
-            
-            all_projections_1.extend(item.projections_1)
-            all_projections_2.extend(item.projections_2)
-            
-            projection_starts_1.append(len(all_projections_1))
-            projection_starts_2.append(len(all_projections_2))
-        
+        # Build consolidated arrays (single pass over the items)
+        n = self.num_items
+        items = self.separation_items
+        unit_ids_1 = np.empty(n, dtype=np.int32)
+        unit_ids_2 = np.empty(n, dtype=np.int32)
+        sizes_1 = np.empty(n, dtype=np.int64)
+        sizes_2 = np.empty(n, dtype=np.int64)
+        for i, item in enumerate(items):
+            unit_ids_1[i] = item._unit_id_1_int
+            unit_ids_2[i] = item._unit_id_2_int
+            sizes_1[i] = item.projections_1.size
+            sizes_2[i] = item.projections_2.size
+        projection_starts_1, all_projections_1 = _consolidate_projections([it.projections_1 for it in items], sizes_1)
+        projection_starts_2, all_projections_2 = _consolidate_projections([it.projections_2 for it in items], sizes_2)
+
         # Store consolidated datasets
-        group.create_dataset("unit_ids_1", data=np.array(unit_ids_1, dtype=np.int32))
-        group.create_dataset("unit_ids_2", data=np.array(unit_ids_2, dtype=np.int32))
-        group.create_dataset("projection_starts_1", data=np.array(projection_starts_1, dtype=np.int32))
-        group.create_dataset("projection_starts_2", data=np.array(projection_starts_2, dtype=np.int32))
-        group.create_dataset("projections_1", data=np.array(all_projections_1, dtype=np.float32))
-        group.create_dataset("projections_2", data=np.array(all_projections_2, dtype=np.float32))
+        compressor = Blosc(cname='lz4', clevel=3, shuffle=Blosc.BITSHUFFLE)
+        group.create_dataset("unit_ids_1", data=unit_ids_1)
+        group.create_dataset("unit_ids_2", data=unit_ids_2)
+        group.create_dataset("projection_starts_1", data=projection_starts_1)
+        group.create_dataset("projection_starts_2", data=projection_starts_2)
+        group.create_dataset("projections_1", data=all_projections_1, compressor=compressor)
+        group.create_dataset("projections_2", data=all_projections_2, compressor=compressor)
+
+
+def _consolidate_projections(projections: list[np.ndarray], sizes: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Concatenate per-item projection arrays into one flat array.
+
+    Returns the start offsets (length num_items + 1, int32) and the
+    concatenated projections (float32).
+    """
+    starts = np.zeros(len(projections) + 1, dtype=np.int32)
+    np.cumsum(sizes, out=starts[1:])
+    if len(projections) == 0:
+        return starts, np.zeros(0, dtype=np.float32)
+    return starts, np.concatenate(projections).astype(np.float32, copy=False)
@@ -4,6 +4,7 @@ import numpy as np
 
 import figpack
 from .figpack_realtime512_extension import figpack_realtime512_extension
+from .quantization import quantize_int16
 
 class MEAFiringRatesAndAmplitudes(figpack.ExtensionView):
     def __init__(
@@ -32,7 +33,7 @@ class MEAFiringRatesAndAmplitudes(figpack.ExtensionView):
         num_frames, num_channels = mean_firing_rates.shape
         
         # Validate electrode coordinates
-        electrode_coords_array = np.array(electrode_coords, dtype=np.float32)
+        electrode_coords_array = np.ascontiguousarray(electrode_coords, dtype=np.float32)
         if electrode_coords_array.ndim != 2 or electrode_coords_array.shape[1] != 2:
             raise ValueError(
                 f"electrode_coords must have shape (num_channels, 2), got {electrode_coords_array.shape}"
@@ -44,8 +45,8 @@ class MEAFiringRatesAndAmplitudes(figpack.ExtensionView):
             )
         
         self.electrode_coords = electrode_coords_array
-        self.mean_firing_rates = mean_firing_rates.astype(np.float32)
-        self.mean_spike_amplitudes = mean_spike_amplitudes.astype(np.float32)
+        self.mean_firing_rates = np.ascontiguousarray(mean_firing_rates, dtype=np.float32)
+        self.mean_spike_amplitudes = np.ascontiguousarray(mean_spike_amplitudes, dtype=np.float32)
         self.num_frames = num_frames
         self.num_channels = num_channels
 
@@ -61,5 +62,11 @@ class MEAFiringRatesAndAmplitudes(figpack.ExtensionView):
         group.attrs["num_frames"] = self.num_frames
         group.attrs["num_channels"] = self.num_channels
         group.create_dataset("electrode_coords", data=self.electrode_coords)
-        group.create_dataset("mean_firing_rates", data=self.mean_firing_rates)
-        group.create_dataset("mean_spike_amplitudes", data=self.mean_spike_amplitudes)
+
+        # Store rates and amplitudes quantized to int16 (value = stored * <name>_scale)
+        mean_firing_rates_q, mean_firing_rates_scale = quantize_int16(self.mean_firing_rates)
+        mean_spike_amplitudes_q, mean_spike_amplitudes_scale = quantize_int16(self.mean_spike_amplitudes)
+        group.attrs["mean_firing_rates_scale"] = mean_firing_rates_scale
+        group.attrs["mean_spike_amplitudes_scale"] = mean_spike_amplitudes_scale
+        group.create_dataset("mean_firing_rates", data=mean_firing_rates_q)
+        group.create_dataset("mean_spike_amplitudes", data=mean_spike_amplitudes_q)
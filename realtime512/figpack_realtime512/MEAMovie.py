@@ -1,6 +1,8 @@
 from typing import Union
 
 import numpy as np
+from numcodecs import Blosc
+from numba import njit
 
 import figpack
 from .figpack_realtime512_extension import figpack_realtime512_extension
@@ -26,6 +28,10 @@ class MEAMovie(figpack.ExtensionView):
             sampling_frequency_hz: Sampling frequency in Hz
             spike_channel_indices: Optional array of channel indices for spikes (dtype uint16)
             spike_frame_indices: Optional array of frame indices for spikes (dtype uint32)
+
+        The data_min and data_max attributes written to the figure are exact.
+        data_median is approximate for data with more than ~1e6 values: it is
+        the median of an evenly strided subsample of about 1e6 values.
         """
         super().__init__(
             extension=figpack_realtime512_extension, view_type="realtime512.MEAMovie"
@@ -36,7 +42,7 @@ class MEAMovie(figpack.ExtensionView):
             raise ValueError(f"raw_data must be 2D array, got shape {raw_data.shape}")
 
         # Convert electrode_coords to numpy array if needed
-        electrode_coords_array = np.array(electrode_coords, dtype=np.float32)
+        electrode_coords_array = np.ascontiguousarray(electrode_coords, dtype=np.float32)
         if electrode_coords_array.ndim != 2 or electrode_coords_array.shape[1] != 2:
             raise ValueError(
                 f"electrode_coords must have shape (num_channels, 2), got {electrode_coords_array.shape}"
@@ -74,12 +80,14 @@ class MEAMovie(figpack.ExtensionView):
                 )
 
             # Validate channel indices are within range
-            if len(spike_channel_indices_array) > 0:
-                if np.max(spike_channel_indices_array) >= num_channels:
+            # (skipped when the dtype cannot hold an out-of-range value)
+            if num_channels <= np.iinfo(np.uint16).max:
+                if int(spike_channel_indices_array.max(initial=0)) >= num_channels:
                     raise ValueError(
                         f"spike_channel_indices contains values >= num_channels ({num_channels})"
                     )
-                if np.max(spike_frame_indices_array) >= num_timepoints:
+            if num_timepoints <= np.iinfo(np.uint32).max:
+                if int(spike_frame_indices_array.max(initial=0)) >= num_timepoints:
                     raise ValueError(
                         f"spike_frame_indices contains values >= num_timepoints ({num_timepoints})"
                     )
@@ -90,7 +98,8 @@ class MEAMovie(figpack.ExtensionView):
             self.spike_channel_indices = None
             self.spike_frame_indices = None
 
-        self.raw_data = raw_data.astype(np.int16)
+        # Only copy if raw_data is not already contiguous int16
+        self.raw_data = np.ascontiguousarray(raw_data, dtype=np.int16)
         self.electrode_coords = electrode_coords_array
         self.start_time_sec = start_time_sec
         self.sampling_frequency_hz = sampling_frequency_hz
@@ -98,9 +107,16 @@ class MEAMovie(figpack.ExtensionView):
         self.num_channels = num_channels
 
         # Calculate global min/max/median for normalization
-        self.data_min = float(np.min(self.raw_data))
-        self.data_max = float(np.max(self.raw_data))
-        self.data_median = float(np.median(self.raw_data))
+        # (min/max in a single pass; median from a subsample of ~1e6 values,
+        # so data_median is approximate for long recordings)
+        if self.raw_data.size > 0:
+            data_min, data_max = _min_max(self.raw_data.reshape(-1))
+        else:
+            data_min, data_max = np.nan, np.nan
+        self.data_min = float(data_min)
+        self.data_max = float(data_max)
+        stride = max(1, self.raw_data.size // 1_000_000)
+        self.data_median = float(np.median(self.raw_data.reshape(-1)[::stride]))
 
     def write_to_zarr_group(self, group: figpack.Group) -> None:
         """
@@ -123,12 +139,16 @@ class MEAMovie(figpack.ExtensionView):
         # Store electrode coordinates
         group.create_dataset("electrode_coords", data=self.electrode_coords)
 
+        # Compress with lz4 + bitshuffle (cheap to decode, works well on int16 traces)
+        compressor = Blosc(cname='lz4', clevel=3, shuffle=Blosc.BITSHUFFLE)
+
         # Store raw data with chunking optimized for time-based access
         # Chunk by a reasonable number of timepoints (100-200)
+        # (all channels in each chunk since the viewer reads whole frames)
         num_timepoints_per_chunk = min(200, self.num_timepoints)
         chunks = (num_timepoints_per_chunk, self.num_channels)
 
-        group.create_dataset("raw_data", data=self.raw_data, chunks=chunks)
+        group.create_dataset("raw_data", data=self.raw_data, chunks=chunks, compressor=compressor)
 
         # Store spike data if provided
         if (
@@ -145,11 +165,25 @@ class MEAMovie(figpack.ExtensionView):
                 "spike_channel_indices",
                 data=self.spike_channel_indices,
                 chunks=(spike_chunk_size,),
+                compressor=compressor,
             )
             group.create_dataset(
                 "spike_frame_indices",
                 data=self.spike_frame_indices,
                 chunks=(spike_chunk_size,),
+                compressor=compressor,
             )
         else:
             group.attrs["num_spikes"] = 0
+
+
+@njit(cache=True)
+def _min_max(a):
+    mn = a[0]
+    mx = a[0]
+    for v in a:
+        if v < mn:
+            mn = v
+        elif v > mx:
+            mx = v
+    return mn, mx
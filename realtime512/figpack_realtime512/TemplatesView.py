@@ -1,9 +1,11 @@
 from typing import Union
 
 import numpy as np
+from numcodecs import Blosc
 
 import figpack
 from .figpack_realtime512_extension import figpack_realtime512_extension
+from .quantization import quantize_int16
 from figpack_spike_sorting.spike_sorting_extension import spike_sorting_extension
 
 
@@ -31,8 +33,8 @@ class TemplatesView(figpack.ExtensionView):
         
         num_templates = templates.shape[0]
 
-        self.templates = templates.astype(np.float32)
-        self.electrode_coords = np.array(electrode_coords, dtype=np.float32)
+        self.templates = np.ascontiguousarray(templates, dtype=np.float32)
+        self.electrode_coords = np.ascontiguousarray(electrode_coords, dtype=np.float32)
         self.num_templates = num_templates
         self.num_channels = num_electrodes
 
@@ -52,5 +54,11 @@ class TemplatesView(figpack.ExtensionView):
         # Store electrode coordinates
         group.create_dataset("electrode_coords", data=self.electrode_coords)
 
-        # Store templates
-        group.create_dataset("templates", data=self.templates)
+        # Store templates quantized to int16 (value = stored * templates_scale)
+        templates_q, templates_scale = quantize_int16(self.templates)
+        group.attrs["templates_scale"] = templates_scale
+        group.create_dataset(
+            "templates",
+            data=templates_q,
+            compressor=Blosc(cname='lz4', clevel=3, shuffle=Blosc.BITSHUFFLE),
+        )
@@ -1,19 +1,21 @@
+import functools
+import os
+
 import figpack
 
+_JS_PATH = os.path.join(os.path.dirname(__file__), "../figpack_realtime512.js")
+
 
+@functools.lru_cache(maxsize=1)
 def _load_javascript_code():
     """Load the JavaScript code from the built figpack_realtime512.js file"""
-    import os
-
-    js_path = os.path.join(os.path.dirname(__file__), "../figpack_realtime512.js")
-    try:
-        with open(js_path, "r", encoding="utf-8") as f:
-            return f.read()
-    except FileNotFoundError:
+    if not os.path.exists(_JS_PATH):
         raise FileNotFoundError(
-            f"Could not find figpack_realtime512.js at {js_path}. "
+            f"Could not find figpack_realtime512.js at {_JS_PATH}. "
             "Make sure to run 'npm run build' to generate the JavaScript bundle."
         )
+    with open(_JS_PATH, "r", encoding="utf-8") as f:
+        return f.read()
 
 
 # Create and register the figpack_realtime512 extension
@@ -0,0 +1,17 @@
+import numpy as np
+
+
+def quantize_int16(a: np.ndarray) -> tuple[np.ndarray, float]:
+    """
+    Quantize a float array to int16 using a symmetric scale.
+
+    Returns the quantized array and the scale such that a ~= q * scale.
+    Raises ValueError if a contains NaN or infinite values.
+    """
+    amax = float(np.max(np.abs(a))) if a.size > 0 else 0.0
+    if not np.isfinite(amax):
+        # (the max of the absolute values is NaN or inf exactly when one is)
+        raise ValueError("Cannot quantize an array containing NaN or infinite values")
+    scale = amax / 32767.0 if amax > 0 else 1.0
+    q = np.round(a / scale).astype(np.int16)
+    return q, scale
@@ -1,49 +1,138 @@
+import os
 from scipy.signal import butter
 import numpy as np
-from multiprocessing import Pool, cpu_count
-from scipy.signal import sosfiltfilt
-from .vision_raw import load_raw_bin_file
+from concurrent.futures import ThreadPoolExecutor
+from os import cpu_count
+from scipy.signal import sosfilt, sosfiltfilt
+from .vision_raw import get_raw_bin_num_samples, load_raw_bin_chunk
 
 
-def _filter_channel_batch(args):
-    """Filter a batch of channels in parallel. Module-level function for multiprocessing."""
-    data_batch, sos = args
+class _RawReadAdvisor:
+    """
+    posix_fadvise hints for reading a raw .bin file sequentially.
+
+    The file is read through bin2py, so the hints are given on a separate
+    descriptor and use the page-cache-wide advice (WILLNEED/DONTNEED).
+    Byte ranges are estimated in proportion to the frame index, since the
+    samples follow a small header. Does nothing where posix_fadvise is not
+    available.
+    """
+
+    def __init__(self, path, num_frames):
+        self.fd = None
+        if not hasattr(os, "posix_fadvise") or num_frames == 0:
+            return
+        self.fd = os.open(path, os.O_RDONLY)
+        self.file_size = os.fstat(self.fd).st_size
+        self.num_frames = num_frames
+
+    def will_need(self, start_frame, end_frame):
+        """Start reading frames [start_frame, end_frame) in the background."""
+        if self.fd is None:
+            return
+        offset = self.file_size * start_frame // self.num_frames
+        end = -(-self.file_size * end_frame // self.num_frames)
+        os.posix_fadvise(self.fd, offset, end - offset, os.POSIX_FADV_WILLNEED)
+
+    def done(self):
+        """Drop the file from the page cache and close the descriptor."""
+        if self.fd is None:
+            return
+        os.posix_fadvise(self.fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        os.close(self.fd)
+        self.fd = None
+
+
+def _settling_length(sos, tol=1e-9):
+    """
+    Number of samples after which the tail of the filter's impulse response
+    holds less than tol of its total absolute sum.
+    """
+    n = 4096
+    while True:
+        impulse = np.zeros(n)
+        impulse[0] = 1
+        h = np.abs(sosfilt(sos, impulse))
+        tail = np.cumsum(h[::-1])[::-1]
+        # Only trust the estimate once the response has settled well within n
+        if tail[n // 2] <= tol * tail[0]:
+            return int(np.argmax(tail <= tol * tail[0]))
+        if n >= 1 << 24:
+            return n
+        n *= 2
+
+
+def _filter_channel_range(data, sos, out, channel_range, margin):
+    """Filter a range of channels, writing the result (minus the leading margin) into the matching columns of out."""
+    lo, hi = channel_range
     # Apply filter along axis 0 (time axis) for this batch of channels
-    return sosfiltfilt(sos, data_batch, axis=0)
+    filtered = sosfiltfilt(sos, data[:, lo:hi], axis=0)
+    out[:, lo:hi] = filtered[margin:margin + out.shape[0]]
 
 
-def apply_bandpass_filter(input_path, output_path, num_channels, lowcust, highcut, fs, order):
+def apply_bandpass_filter(input_path, output_path, num_channels, lowcust, highcut, fs, order, chunk_duration_sec=30.0, min_overlap_sec=0.1):
     def butter_bandpass(lowcut, highcut, fs, order=5):
         sos = butter(order, [lowcut, highcut], fs=fs, btype='band', output='sos')
         return sos
 
-    # Read raw data
-    data = load_raw_bin_file(input_path, num_channels)
-
     # Design filter
     sos = butter_bandpass(lowcust, highcut, fs, order=order)
 
     # Determine number of workers (use all available cores)
-    num_workers = cpu_count()
+    num_workers = cpu_count() or 1
     
     # Split channels into batches for parallel processing
     channels_per_worker = max(1, num_channels // num_workers)
-    
-    # Create batches of channels
-    batches = []
-    for i in range(0, num_channels, channels_per_worker):
-        end_idx = min(i + channels_per_worker, num_channels)
-        batch = data[:, i:end_idx]
-        batches.append((batch, sos))
-    
-    # Process batches in parallel
+    channel_ranges = [
+        (i, min(i + channels_per_worker, num_channels))
+        for i in range(0, num_channels, channels_per_worker)
+    ]
+
+    # Process the recording in time chunks so peak memory is bounded by the
+    # chunk size. Each chunk is read with extra samples on either side so
+    # the filter edge transients fall outside the part that is written. The
+    # overlap is the filter's settling length (which grows as lowcut drops),
+    # so the output matches filtering the whole file at once; if that is not
+    # small compared to the chunk size, the whole file is filtered at once.
+    num_frames = get_raw_bin_num_samples(input_path)
+    chunk_size = max(1, int(chunk_duration_sec * fs))
+    overlap = max(int(min_overlap_sec * fs), _settling_length(sos))
+    if 2 * overlap >= chunk_size:
+        chunk_size = max(1, num_frames)
+
+    # Memory-map the output file so filtered chunks are written in place
+    filtered_data = np.memmap(output_path, dtype=np.int16, mode='w+', shape=(num_frames, num_channels))
+
+    # The raw file is read once, front to back: ask the kernel to start
+    # reading the next chunk while the current one is filtered, and to drop
+    # the raw file from the page cache afterwards
+    raw_advisor = _RawReadAdvisor(input_path, num_frames)
+
     print(f"Filtering {num_channels} channels using {num_workers} workers...")
-    with Pool(processes=num_workers) as pool:
-        filtered_batches = pool.map(_filter_channel_batch, batches)
-    
-    # Concatenate filtered batches back together
-    filtered_data = np.concatenate(filtered_batches, axis=1)
+    try:
+        with ThreadPoolExecutor(max_workers=num_workers) as executor:
+            for t0 in range(0, num_frames, chunk_size):
+                t1 = min(t0 + chunk_size, num_frames)
+                t_lo = max(0, t0 - overlap)
+                t_hi = min(num_frames, t1 + overlap)
+                if t1 < num_frames:
+                    raw_advisor.will_need(max(0, t1 - overlap), min(num_frames, t1 + chunk_size + overlap))
+
+                # Read raw data for this chunk
+                data = load_raw_bin_chunk(input_path, t_lo, t_hi)
+                out = filtered_data[t0:t1]
+
+                # Process batches in parallel threads (sosfiltfilt releases the GIL),
+                # so workers share the input and write directly into the output file
+                if num_workers == 1:
+                    # sosfiltfilt already vectorizes across channels, so filter in one call
+                    _filter_channel_range(data, sos, out, (0, num_channels), t0 - t_lo)
+                else:
+                    list(executor.map(lambda channel_range: _filter_channel_range(data, sos, out, channel_range, t0 - t_lo), channel_ranges))
+    finally:
+        raw_advisor.done()
 
     # Save filtered data
-    filtered_data.astype(np.int16).tofile(output_path)
-    print(f"Filtered data saved to {output_path}.")
\ No newline at end of file
+    filtered_data.flush()
+    del filtered_data
+    print(f"Filtered data saved to {output_path}.")
@@ -1,4 +1,6 @@
 import numpy as np
+from numba import njit, prange
+from scipy.ndimage import maximum_filter1d
 
 
 def compute_channel_spike_stats(*, data, sampling_frequency_hz, threshold: float):
@@ -14,16 +16,17 @@ def compute_channel_spike_stats(*, data, sampling_frequency_hz, threshold: float
     
     # Count spikes per channel
     num_spikes = spike_mask.sum(axis=0)
-    mean_firing_rates = (num_spikes.astype(np.float32) / duration_sec)
+    mean_firing_rates = np.divide(num_spikes, duration_sec, dtype=np.float32)
 
     # Compute mean spike amplitudes
-    # Set non-spike values to NaN so we can use nanmean
-    spike_values = np.where(spike_mask, data_float, np.nan)
-    mean_spike_amplitudes = -np.nanmean(spike_values, axis=0)
-    
-    # Handle channels with no spikes (nanmean returns nan)
-    mean_spike_amplitudes = np.nan_to_num(mean_spike_amplitudes, nan=0.0).astype(np.float32)
-    
+    # Sum the spike values per channel in one pass (masked reduction, so the
+    # mask is never expanded to a float array) and divide by the spike counts
+    spike_sums = np.sum(data_float, axis=0, where=spike_mask, dtype=np.float64).astype(np.float32)
+
+    # Channels with no spikes get an amplitude of 0
+    mean_spike_amplitudes = np.zeros(num_channels, dtype=np.float32)
+    np.divide(-spike_sums, num_spikes, out=mean_spike_amplitudes, where=num_spikes > 0)
+
     return mean_firing_rates, mean_spike_amplitudes
 
 def detect_spikes_multichannel(data: np.ndarray, *, threshold: float, sign: int, window_size: int):
@@ -37,37 +40,76 @@ def detect_spikes_multichannel(data: np.ndarray, *, threshold: float, sign: int,
         return detect_spikes_multichannel(-data, threshold=-threshold, sign=1, window_size=window_size)
     elif sign != 1:
         raise ValueError("sign must be either 1 or -1")
-    
+
+    pad_width = window_size // 2
+
+    if data.ndim == 2 and data.dtype == np.float32:
+        # Fused single pass (compiled)
+        return _detect_local_maxima(data, np.float32(threshold), pad_width)
+
     # Find all candidates above threshold (boolean mask)
-    candidates = data > threshold
+    spike_mask = data > threshold
 
     # For each candidate, check if it's a local maximum within the window
-    # Use a sliding window approach
-    pad_width = window_size // 2
+    # Use running maxima over the half-windows on either side, reusing one
+    # float buffer and one boolean buffer instead of allocating temporaries
 
-    # Pad data to handle boundaries
-    data = data.astype(np.float32)  # ensure float for -inf
-    data_padded = np.pad(data, ((pad_width, pad_width), (0, 0)), mode='constant', constant_values=-np.inf)
-    
-    # Create a mask for local maxima
-    is_local_max = np.ones_like(data, dtype=bool)
-    
-    # Check each offset in the window
-    for offset in range(-pad_width, pad_width + 1):
-        if offset == 0:
-            continue
-        # Shift data and compare
-        shifted = data_padded[pad_width + offset : pad_width + offset + data.shape[0], :]
-        if offset < 0:
+    data = data.astype(np.float32, copy=False)  # ensure float for -inf
+
+    if pad_width > 0:
+        running_max = np.empty_like(data)
+        cmp = np.empty(data.shape, dtype=bool)
+
+        # Max over [t - pad_width + 1, t] (out-of-range samples count as -inf)
+        maximum_filter1d(
+            data, size=pad_width, axis=0, output=running_max, mode='constant', cval=-np.inf, origin=(pad_width - 1) // 2
+        )
+        # For earlier time points, allow ties (>=)
+        np.greater_equal(data[1:], running_max[:-1], out=cmp[1:])
+        spike_mask[1:] &= cmp[1:]
+
+        # Max over [t, t + pad_width - 1]
+        maximum_filter1d(
+            data, size=pad_width, axis=0, output=running_max, mode='constant', cval=-np.inf, origin=-(pad_width // 2)
+        )
+        # For later time points, require strict greater than (>)
+        np.greater(data[:-1], running_max[1:], out=cmp[:-1])
+        spike_mask[:-1] &= cmp[:-1]
+
+    # Must be above threshold AND local maximum
+    return spike_mask
+
+# Compiled eagerly for the one signature used (and cached on disk), so
+# there is no JIT pause on the first call
+@njit("boolean[:, :](float32[:, :], float32, int64)", parallel=True, cache=True)
+def _detect_local_maxima(data, threshold, pad_width):
+    """
+    Compiled equivalent of the NumPy path in detect_spikes_multichannel.
+
+    Rows are processed in parallel. The window around a sample is only
+    inspected when the sample is above threshold, so most samples are
+    touched once.
+    """
+    num_frames, num_channels = data.shape
+    spike_mask = np.zeros((num_frames, num_channels), dtype=np.bool_)
+    for t in prange(num_frames):
+        for c in range(num_channels):
+            value = data[t, c]
+            if not value > threshold:
+                continue
+            is_local_max = True
             # For earlier time points, allow ties (>=)
-            is_local_max &= data >= shifted
-        else:
-            # For later time points, require strict greater than (>)
-            is_local_max &= data > shifted
-    
-    # Combine: must be above threshold AND local maximum
-    spike_mask = candidates & is_local_max
-    
+            for t2 in range(max(0, t - pad_width), t):
+                if not value >= data[t2, c]:
+                    is_local_max = False
+                    break
+            if is_local_max:
+                # For later time points, require strict greater than (>)
+                for t2 in range(t + 1, min(num_frames, t + pad_width + 1)):
+                    if not value > data[t2, c]:
+                        is_local_max = False
+                        break
+            spike_mask[t, c] = is_local_max
     return spike_mask
 
 def detect_spikes_single_channel(*, data, threshold: float, sign: int, window_size: int):
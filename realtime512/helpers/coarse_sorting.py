@@ -1,7 +1,17 @@
+from concurrent.futures import ThreadPoolExecutor
+from os import cpu_count
+
 import numpy as np
-from sklearn.neighbors import NearestNeighbors
+from numba import njit, prange
+from scipy.spatial import cKDTree
 import sklearn.cluster
 
+# Above this many dimensions neighbors are found by brute force
+_KDTREE_MAX_DIM = 32
+
+# Rows per nearest-cluster query in assign_labels_from_subsample
+_ASSIGN_BLOCK_SIZE = 65536
+
 def find_nearest_neighbors(data: np.ndarray, *, num_neighbors: int):
     """
     Find nearest neighbors for each data point.
@@ -18,11 +28,40 @@ def find_nearest_neighbors(data: np.ndarray, *, num_neighbors: int):
     np.ndarray
         Array of indices of nearest neighbors for each data point
     """
-    nbrs = NearestNeighbors(n_neighbors=num_neighbors, algorithm='auto').fit(data)
-    distances, indices = nbrs.kneighbors(data)
+    if num_neighbors > data.shape[0]:
+        raise ValueError(
+            f"num_neighbors ({num_neighbors}) must be <= number of data points ({data.shape[0]})"
+        )
+    if data.ndim == 2 and data.shape[1] > _KDTREE_MAX_DIM:
+        # KD-trees degrade to brute force in high dimensions
+        return _find_nearest_neighbors_brute_force(data, num_neighbors=num_neighbors)
+    tree = cKDTree(data)
+    distances, indices = tree.query(data, k=num_neighbors, workers=-1)
+    return indices.reshape(data.shape[0], num_neighbors)
+
+def _find_nearest_neighbors_brute_force(data: np.ndarray, *, num_neighbors: int, block_size: int = 1024):
+    """
+    Brute-force nearest neighbors using |x|^2 + |y|^2 - 2 x.y, so the
+    pairwise distances come from one matrix product per block of rows.
+    """
+    X = np.ascontiguousarray(data, dtype=np.float32)
+    num_points = X.shape[0]
+    sq_norms = np.einsum('ij,ij->i', X, X, dtype=np.float64)
+    indices = np.empty((num_points, num_neighbors), dtype=np.intp)
+    for start in range(0, num_points, block_size):
+        stop = min(start + block_size, num_points)
+        d2 = sq_norms[start:stop, None] + sq_norms[None, :] - 2.0 * (X[start:stop] @ X.T)
+        # A point's distance to itself is exactly zero
+        d2[np.arange(stop - start), np.arange(start, stop)] = 0
+        if num_neighbors < num_points:
+            candidates = np.argpartition(d2, num_neighbors - 1, axis=1)[:, :num_neighbors]
+        else:
+            candidates = np.broadcast_to(np.arange(num_points), d2.shape)
+        order = np.argsort(np.take_along_axis(d2, candidates, axis=1), axis=1, kind='stable')
+        indices[start:stop] = np.take_along_axis(candidates, order, axis=1)
     return indices
 
-def cluster_kmeans(data: np.ndarray, *, num_clusters: int):
+def cluster_kmeans(data: np.ndarray, *, num_clusters: int, method: str = "auto"):
     """
     Cluster data using K-means algorithm.
     
@@ -32,16 +71,90 @@ def cluster_kmeans(data: np.ndarray, *, num_clusters: int):
         Data array where each row is a data point
     num_clusters : int
         Number of clusters to create
+    method : str
+        "faiss", "minibatch" (sklearn MiniBatchKMeans), "elkan" (sklearn
+        KMeans with Elkan's algorithm), or "auto" to use faiss when it is
+        installed and MiniBatchKMeans otherwise
     
     Returns
     -------
     np.ndarray
         Array of cluster labels (1-based)
     """
-    kmeans = sklearn.cluster.KMeans(n_clusters=num_clusters, n_init=10)
+    if method not in ("auto", "faiss", "minibatch", "elkan"):
+        raise ValueError(f"Unknown k-means method: {method}")
+    faiss = None
+    if method in ("auto", "faiss"):
+        try:
+            import faiss
+        except ImportError:
+            if method == "faiss":
+                raise
+    if faiss is not None:
+        # faiss does the assignment step as one SGEMM per iteration
+        data_f32 = np.ascontiguousarray(data, dtype=np.float32)
+        kmeans = faiss.Kmeans(d=data_f32.shape[1], k=num_clusters, niter=20, nredo=3, gpu=False)
+        kmeans.train(data_f32)
+        _, labels = kmeans.index.search(data_f32, 1)
+        return labels[:, 0] + 1  # make labels 1-based
+
+    if method == "elkan":
+        # Triangle-inequality bounds skip most distance computations
+        kmeans = sklearn.cluster.KMeans(
+            n_clusters=num_clusters,
+            n_init=3,
+            algorithm="elkan",
+            tol=1e-3,
+            max_iter=100
+        )
+    else:
+        kmeans = sklearn.cluster.MiniBatchKMeans(
+            n_clusters=num_clusters,
+            n_init=3,
+            batch_size=min(4096, len(data)),
+            max_iter=100
+        )
     labels = kmeans.fit_predict(data)
     return labels + 1  # make labels 1-based
 
+def assign_labels_from_subsample(data: np.ndarray, subsample_inds: np.ndarray, subsample_labels: np.ndarray):
+    """
+    Label all data points given cluster labels for a subsample.
+    
+    Parameters
+    ----------
+    data : np.ndarray
+        Data array where each row is a data point
+    subsample_inds : np.ndarray
+        Indices of the rows of data that were clustered
+    subsample_labels : np.ndarray
+        Cluster labels (1-based) for the subsample
+    
+    Returns
+    -------
+    np.ndarray
+        Array of cluster labels (1-based) for all data points. Subsample points
+        keep their labels; the others get the label of the nearest cluster mean.
+    """
+    subsample_labels = np.asarray(subsample_labels)
+    num_clusters = int(np.max(subsample_labels))
+    cluster_means = np.zeros((num_clusters, data.shape[1]), dtype=np.float64)
+    np.add.at(cluster_means, subsample_labels - 1, data[subsample_inds])
+    counts = np.bincount(subsample_labels - 1, minlength=num_clusters)
+    # Only labels that actually occur in the subsample are candidates
+    present = np.flatnonzero(counts > 0)
+    cluster_means = cluster_means[present] / counts[present][:, None]
+    
+    tree = cKDTree(cluster_means)
+    # Query in blocks, so only one block of data is converted to float64 at a time
+    nearest = np.empty(data.shape[0], dtype=np.intp)
+    for start in range(0, data.shape[0], _ASSIGN_BLOCK_SIZE):
+        stop = start + _ASSIGN_BLOCK_SIZE
+        _, nearest[start:stop] = tree.query(data[start:stop], k=1, workers=-1)
+    labels = (present[nearest] + 1).astype(subsample_labels.dtype)
+    labels[subsample_inds] = subsample_labels
+    return labels
+
 def compute_template_peak_channel_x_coordinate(templates: np.ndarray, electrode_coords: np.ndarray):
     """
     Compute the x-coordinate of the peak channel for each template.
@@ -58,13 +171,9 @@ def compute_template_peak_channel_x_coordinate(templates: np.ndarray, electrode_
     np.ndarray
         Array of x-coordinates, shape (num_templates, 1)
     """
-    num_templates = templates.shape[0]
-    template_x_coords = np.zeros((num_templates, 1), dtype=np.float32)
-    electrode_coords = np.array(electrode_coords)
-    for k in range(num_templates):
-        template = templates[k, :]
-        peak_channel = np.argmin(template)
-        template_x_coords[k, 0] = electrode_coords[peak_channel, 0]
+    electrode_coords = np.asarray(electrode_coords)
+    peak_channels = np.argmin(templates, axis=1)
+    template_x_coords = electrode_coords[peak_channels, 0].reshape(-1, 1).astype(np.float32)
     return template_x_coords
 
 def detect_spikes_single_channel(data: np.ndarray, threshold: float, sign: int, window_size: int):
@@ -96,6 +205,54 @@ def detect_spikes_single_channel(data: np.ndarray, threshold: float, sign: int,
     spike_inds = np.where(spike_mask[:, 0])[0]
     return spike_inds
 
+@njit(parallel=True, cache=True)
+def _detect_min_spikes(data, mask, threshold, pad_width):
+    """
+    Detect negative spikes on the minimum across channels in one kernel.
+
+    Equivalent to taking the row-wise minimum of data (with rows where mask
+    is False treated as zero) and calling detect_spikes_single_channel with
+    sign=-1 on it: the minimum must be below threshold, <= the minima of the
+    preceding pad_width rows and < the minima of the following pad_width rows.
+
+    Returns a boolean array of length num_frames.
+    """
+    num_frames, num_channels = data.shape
+
+    # Row-wise minimum (single pass over the data), kept in the data's dtype
+    # (int16 for the shifted data) so the second pass reads a quarter of
+    # the bytes a float64 buffer would need
+    data_min = np.zeros(num_frames, dtype=data.dtype)
+    for t in prange(num_frames):
+        if not mask[t]:
+            continue
+        m = data[t, 0]
+        for c in range(1, num_channels):
+            if data[t, c] < m:
+                m = data[t, c]
+        data_min[t] = m
+
+    # Threshold and local minimum check
+    is_spike = np.zeros(num_frames, dtype=np.bool_)
+    for t in prange(num_frames):
+        value = data_min[t]
+        if not value < threshold:
+            continue
+        is_local_min = True
+        # For earlier time points, allow ties
+        for t2 in range(max(0, t - pad_width), t):
+            if not value <= data_min[t2]:
+                is_local_min = False
+                break
+        if is_local_min:
+            # For later time points, require strict less than
+            for t2 in range(t + 1, min(num_frames, t + pad_width + 1)):
+                if not value < data_min[t2]:
+                    is_local_min = False
+                    break
+        is_spike[t] = is_local_min
+    return is_spike
+
 def compute_coarse_sorting(
     shifted_data,
     high_activity_intervals,
@@ -103,7 +260,8 @@ def compute_coarse_sorting(
     electrode_coords,
     detect_threshold=-80,
     num_nearest_neighbors=20,
-    num_clusters=100
+    num_clusters=100,
+    max_num_spikes_for_clustering=50000
 ):
     """
     Perform coarse spike sorting on shifted data.
@@ -112,7 +270,7 @@ def compute_coarse_sorting(
     ----------
     shifted_data : np.ndarray
         Shifted data array of shape (num_frames, num_channels)
-    high_activity_intervals : list of tuple
+    high_activity_intervals : list of tuple or np.ndarray
         List of (start_sec, end_sec) tuples for high activity periods to exclude
     sampling_frequency_hz : float
         Sampling frequency in Hz
@@ -124,6 +282,9 @@ def compute_coarse_sorting(
         Number of nearest neighbors for clustering (default: 20)
     num_clusters : int
         Number of clusters for K-means (default: 100)
+    max_num_spikes_for_clustering : int
+        If more spikes are detected, cluster a random subsample of this size
+        and assign the remaining spikes to the nearest cluster (default: 50000)
         
     Returns
     -------
@@ -139,25 +300,21 @@ def compute_coarse_sorting(
     num_frames, num_channels = shifted_data.shape
     
     # Create mask for low activity frames
-    low_activity_mask = np.ones(num_frames, dtype=bool)
-    for start_sec, end_sec in high_activity_intervals:
-        start_frame = int(start_sec * sampling_frequency_hz)
-        end_frame = int(end_sec * sampling_frequency_hz)
-        start_frame = max(0, start_frame)
-        end_frame = min(num_frames, end_frame)
-        low_activity_mask[start_frame:end_frame] = False
-    
-    # Set high activity frames to zero
-    shifted_data_low_activity = shifted_data.copy()
-    shifted_data_low_activity[~low_activity_mask, :] = 0
+    # (+1 at interval starts, -1 at ends, so frames with a positive running
+    # sum are inside some interval)
+    intervals = np.asarray(high_activity_intervals, dtype=np.float64).reshape(-1, 2)
+    interval_frames = np.clip((intervals * sampling_frequency_hz).astype(np.int64), 0, num_frames)
+    interval_frames = interval_frames[interval_frames[:, 0] < interval_frames[:, 1]]
+    diff = np.zeros(num_frames + 1, dtype=np.int64)
+    np.add.at(diff, interval_frames[:, 0], 1)
+    np.add.at(diff, interval_frames[:, 1], -1)
+    low_activity_mask = np.cumsum(diff[:-1]) == 0
     
     # Detect spikes on minimum across channels
-    data_min = np.min(shifted_data_low_activity, axis=1)
-    spike_inds = detect_spikes_single_channel(
-        data=data_min,
-        threshold=detect_threshold,
-        sign=-1,
-        window_size=10
+    # (row minimum, threshold and local-minimum check fused in one pass)
+    window_size = 10
+    spike_inds = np.flatnonzero(
+        _detect_min_spikes(shifted_data, low_activity_mask, float(detect_threshold), window_size // 2)
     )
     
     print(f'Detected {len(spike_inds)} spikes')
@@ -171,8 +328,11 @@ def compute_coarse_sorting(
             np.array([], dtype=np.float32)
         )
     
-    # Extract spike frames
-    frames = shifted_data_low_activity[spike_inds, :].astype(np.float32)
+    # Extract spike frames (high activity frames are treated as zero). They
+    # are kept as int16; only the rows passed to the clustering are converted
+    # to float32
+    frames = shifted_data[spike_inds, :]
+    frames[~low_activity_mask[spike_inds], :] = 0
 
     # tmpfile_path = '/tmp/coarse_sorting_debug_frames.npy'
     # np.save(tmpfile_path, frames)
@@ -196,40 +356,67 @@ def compute_coarse_sorting(
     use_isosplit = True
     if use_isosplit:
         from isosplit import isosplit
-        labels = isosplit(
-            frames.astype(np.float32),
-            initial_k=600,
-            dip_threshold=2,
-            use_lda_for_merge_test=False
-        )
-        num_clusters_found = np.max(labels)
+        if len(frames) > max_num_spikes_for_clustering:
+            # Cluster a random subsample, then assign the rest by nearest cluster mean
+            print(f'Clustering a subsample of {max_num_spikes_for_clustering} of {len(frames)} spikes...')
+            rng = np.random.default_rng(0)
+            subsample_inds = np.sort(rng.choice(len(frames), max_num_spikes_for_clustering, replace=False))
+            subsample_labels = isosplit(
+                frames[subsample_inds].astype(np.float32),
+                initial_k=600,
+                dip_threshold=2,
+                use_lda_for_merge_test=False
+            )
+            labels = assign_labels_from_subsample(frames, subsample_inds, subsample_labels)
+        else:
+            labels = isosplit(
+                frames.astype(np.float32),
+                initial_k=600,
+                dip_threshold=2,
+                use_lda_for_merge_test=False
+            )
     else:
         # use k-means directly on frames
         n_clusters = 70 # hard-coded for now
         print(f'Clustering into {n_clusters} clusters using k-means...')
-        labels = cluster_kmeans(frames, num_clusters=n_clusters)
-        num_clusters_found = np.max(labels)
+        labels = cluster_kmeans(frames.astype(np.float32), num_clusters=n_clusters)
+    
+    # Relabel to 1..num_clusters_found, skipping any unused labels
+    unique_labels = np.unique(labels)
+    label_remap = np.zeros(unique_labels[-1] + 1, dtype=np.int32)
+    label_remap[unique_labels] = np.arange(1, len(unique_labels) + 1, dtype=np.int32)
+    labels = label_remap[labels]
+    num_clusters_found = len(unique_labels)
     
     # Compute cluster templates
+    # Sort the frames by label once so each cluster is a contiguous slice
+    order = np.argsort(labels, kind='stable')
+    sorted_frames = frames[order]
+    cluster_bounds = np.searchsorted(labels[order], np.arange(1, num_clusters_found + 2))
     templates = np.zeros((num_clusters_found, num_channels), dtype=np.float32)
-    for k in range(1, num_clusters_found + 1):
+
+    def compute_template(k):
         # Should we use mean or median here?
-        templates[k - 1, :] = np.median(frames[labels == k, :], axis=0)
+        templates[k - 1, :] = np.median(sorted_frames[cluster_bounds[k - 1]:cluster_bounds[k]], axis=0)
+
+    # Clusters are independent; np.median releases the GIL while sorting
+    with ThreadPoolExecutor(max_workers=cpu_count() or 1) as executor:
+        list(executor.map(compute_template, range(1, num_clusters_found + 1)))
     
     # Sort templates by peak channel x-coordinate
-    template_x_coords = compute_template_peak_channel_x_coordinate(templates, np.array(electrode_coords))
+    template_x_coords = compute_template_peak_channel_x_coordinate(templates, electrode_coords)
     sorted_indices = np.argsort(template_x_coords[:, 0])
     templates = templates[sorted_indices, :]
     
     # Create mapping from old labels to new sorted labels
     old_to_new = np.zeros(num_clusters_found + 1, dtype=np.int32)
-    for new_idx, old_idx in enumerate(sorted_indices):
-        old_to_new[old_idx + 1] = new_idx + 1  # +1 because labels are 1-based
+    old_to_new[sorted_indices + 1] = np.arange(1, num_clusters_found + 1, dtype=np.int32)  # +1 because labels are 1-based
     
     # Remap spike labels to sorted order
     spike_labels = old_to_new[labels].astype(np.int32)
     
     # Compute spike amplitudes from denoised frames (negative of minimum value across channels)
+    # (negated after the float conversion, since -(-32768) overflows int16)
     spike_amplitudes = -np.min(frames, axis=1).astype(np.float32)
     
     # Return results
@@ -11,7 +11,7 @@ def set_high_activity_to_zero(*, data, sampling_frequency_hz, high_activity_inte
         The data array to process
     sampling_frequency_hz : float
         Sampling frequency in Hz
-    high_activity_intervals : list of tuple
+    high_activity_intervals : list of tuple or np.ndarray
         List of (start_sec, end_sec) tuples defining high activity intervals
     start_frame : int
         Start frame of the current data chunk
@@ -21,20 +21,28 @@ def set_high_activity_to_zero(*, data, sampling_frequency_hz, high_activity_inte
     Returns
     -------
     np.ndarray
-        Copy of data with high activity intervals set to zero
+        Copy of data with high activity intervals set to zero. If there are
+        no high activity intervals, data itself is returned (not a copy), so
+        the result should not be modified in place.
     """
+    if len(high_activity_intervals) == 0:
+        return data
     data_copy = data.copy()
-    for interval in high_activity_intervals:
-        seg_start_sec, seg_end_sec = interval
-        seg_start_frame = int(seg_start_sec * sampling_frequency_hz)
-        seg_end_frame = int(seg_end_sec * sampling_frequency_hz)
-        
-        # Clip to current data chunk
-        seg_start_frame_clipped = max(seg_start_frame, start_frame)
-        seg_end_frame_clipped = min(seg_end_frame, end_frame)
-        
-        if seg_start_frame_clipped < seg_end_frame_clipped:
-            relative_start = seg_start_frame_clipped - start_frame
-            relative_end = seg_end_frame_clipped - start_frame
-            data_copy[relative_start:relative_end, :] = 0
+    num_frames = data_copy.shape[0]
+
+    intervals = np.asarray(high_activity_intervals, dtype=np.float64).reshape(-1, 2)
+    seg_frames = (intervals * sampling_frequency_hz).astype(np.int64)
+
+    # Clip to current data chunk, relative to start_frame
+    relative_starts = np.clip(np.maximum(seg_frames[:, 0], start_frame) - start_frame, 0, num_frames)
+    relative_ends = np.clip(np.minimum(seg_frames[:, 1], end_frame) - start_frame, 0, num_frames)
+    valid = relative_starts < relative_ends
+
+    # Build one frame mask covering all intervals (+1 at starts, -1 at ends)
+    diff = np.zeros(num_frames + 1, dtype=np.int64)
+    np.add.at(diff, relative_starts[valid], 1)
+    np.add.at(diff, relative_ends[valid], -1)
+    mask = np.cumsum(diff[:-1]) > 0
+
+    data_copy[mask, :] = 0
     return data_copy
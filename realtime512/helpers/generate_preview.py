@@ -1,7 +1,9 @@
 import json
 import os
+from typing import Optional, Union
 
 import numpy as np
+from numba import njit
 
 import figpack.views as vv
 import figpack_spike_sorting.views as ssv
@@ -26,10 +28,13 @@ def generate_preview(
     electrode_coords: np.ndarray,
     preview_path: str
 ):
+    # Memory-map the filtered data once and share it between the previews
+    filt_data = np.memmap(filt_path, dtype=np.int16, mode='r').reshape(-1, n_channels)
+
     # Time series preview for filtered data
     filt_time_series = generate_time_series_preview(
-        data_path=filt_path,
-        channel_indices=list(range(min(64, n_channels))),
+        data=filt_data,
+        channel_indices=slice(0, min(64, n_channels)),
         sampling_frequency=sampling_frequency,
         num_channels=n_channels,
         high_activity_intervals=high_activity_intervals,
@@ -38,7 +43,7 @@ def generate_preview(
 
     # Movie preview for filtered data
     filt_movie = MEAMovie(
-        raw_data=np.fromfile(filt_path, dtype=np.int16).reshape(-1, n_channels),
+        raw_data=filt_data,
         electrode_coords=electrode_coords,
         start_time_sec=0,
         sampling_frequency_hz=sampling_frequency
@@ -58,7 +63,7 @@ def generate_preview(
     # Templates view
     templates_path = coarse_sorting_path + "/templates.npy"
     if os.path.exists(templates_path):
-        templates = np.load(templates_path)
+        templates = np.load(templates_path, mmap_mode='r')
         templates_view = TemplatesView(
             templates=templates,
             electrode_coords=electrode_coords
@@ -82,7 +87,8 @@ def generate_preview(
         # Create cluster separation view and spike frames movie
         if os.path.exists(templates_path) and os.path.exists(shift_path):
             print('Creating cluster separation view...')
-            shifted_data = np.fromfile(shift_path, dtype=np.int16).reshape(-1, n_channels)
+            # Memory-mapped: only the frames around spikes are gathered from it
+            shifted_data = np.memmap(shift_path, dtype=np.int16, mode='r').reshape(-1, n_channels)
             cluster_separation_view = create_cluster_separation_view(
                 templates=templates,
                 shifted_data=shifted_data,
@@ -198,6 +204,32 @@ def create_cluster_separation_view(
     print(f'Finding {num_neighbors} nearest neighbors for each unit in template space...')
     neighbor_indices = find_nearest_neighbors(templates, num_neighbors=num_neighbors + 1)
     
+    # Discriminant directions (difference of template means) and their norms
+    # for every unit/neighbor pair, computed in one vectorized pass over
+    # contiguous float32 templates
+    templates_f32 = np.ascontiguousarray(templates, dtype=np.float32)
+    template_diffs = templates_f32[neighbor_indices[:, 1:]] - templates_f32[:, None, :]
+    template_diff_norms = np.linalg.norm(template_diffs, axis=2)
+    
+    # Group spike indices by label once: the spikes of unit u are
+    # spike_order[unit_starts[u - 1]:unit_starts[u]]
+    spike_order = np.argsort(spike_labels, kind='stable')
+    unit_starts = np.searchsorted(spike_labels[spike_order], np.arange(1, num_units + 2))
+    
+    # Spike frame indices and their validity, computed once for all spikes
+    spike_frames_all = (spike_times * sampling_frequency).astype(int)
+    valid_frames_all = (spike_frames_all >= 0) & (spike_frames_all < shifted_data.shape[0])
+    
+    # Spike waveforms per unit, gathered from shifted_data at most once
+    waveforms_by_unit = {}
+    
+    def get_unit_waveforms(unit_id, spike_inds):
+        if unit_id not in waveforms_by_unit:
+            # Get spike frame indices (filtering out invalid frame indices)
+            spike_frames = spike_frames_all[spike_inds][valid_frames_all[spike_inds]]
+            waveforms_by_unit[unit_id] = shifted_data[spike_frames, :]
+        return waveforms_by_unit[unit_id]
+    
     # Build separation items for each unit and its neighbors
     # Track processed pairs to avoid redundancy
     processed_pairs = set()
@@ -209,7 +241,7 @@ def create_cluster_separation_view(
         # Get neighbor indices (excluding self at index 0)
         neighbor_unit_indices = neighbor_indices[unit_idx, 1:]
         
-        for neighbor_idx in neighbor_unit_indices:
+        for j, neighbor_idx in enumerate(neighbor_unit_indices):
             neighbor_id = neighbor_idx + 1  # 1-based
             
             # Skip if we've already processed this pair (in either order)
@@ -219,39 +251,28 @@ def create_cluster_separation_view(
             processed_pairs.add(pair_key)
             
             # Get spike indices for both units
-            spike_inds_1 = np.where(spike_labels == unit_id)[0]
-            spike_inds_2 = np.where(spike_labels == neighbor_id)[0]
+            spike_inds_1 = spike_order[unit_starts[unit_id - 1]:unit_starts[unit_id]]
+            spike_inds_2 = spike_order[unit_starts[neighbor_id - 1]:unit_starts[neighbor_id]]
             
             if len(spike_inds_1) < 2 or len(spike_inds_2) < 2:
                 continue
             
-            # Compute discriminant direction (difference of template means)
-            template_1 = templates[unit_idx, :]
-            template_2 = templates[neighbor_idx, :]
-            discriminant_direction = template_2 - template_1
-            norm = np.linalg.norm(discriminant_direction)
+            # Normalize the discriminant direction in place
+            norm = template_diff_norms[unit_idx, j]
             if norm > 0:
-                discriminant_direction = discriminant_direction / norm
+                discriminant_direction = template_diffs[unit_idx, j]
+                np.divide(discriminant_direction, norm, out=discriminant_direction)
             else:
                 continue
             
-            # Get spike frame indices
-            spike_frames_1 = (spike_times[spike_inds_1] * sampling_frequency).astype(int)
-            spike_frames_2 = (spike_times[spike_inds_2] * sampling_frequency).astype(int)
-            
-            # Filter out invalid frame indices
-            valid_frames_1 = (spike_frames_1 >= 0) & (spike_frames_1 < shifted_data.shape[0])
-            valid_frames_2 = (spike_frames_2 >= 0) & (spike_frames_2 < shifted_data.shape[0])
-            spike_frames_1 = spike_frames_1[valid_frames_1]
-            spike_frames_2 = spike_frames_2[valid_frames_2]
+            # Extract spike waveforms (cached per unit)
+            spike_waveforms_1 = get_unit_waveforms(unit_id, spike_inds_1)
+            spike_waveforms_2 = get_unit_waveforms(neighbor_id, spike_inds_2)
             
-            if len(spike_frames_1) == 0 or len(spike_frames_2) == 0:
+            if len(spike_waveforms_1) == 0 or len(spike_waveforms_2) == 0:
                 continue
             
-            # Extract spike waveforms and project onto discriminant direction
-            spike_waveforms_1 = shifted_data[spike_frames_1, :]
-            spike_waveforms_2 = shifted_data[spike_frames_2, :]
-            
+            # Project onto discriminant direction
             projections_1 = np.dot(spike_waveforms_1, discriminant_direction)
             projections_2 = np.dot(spike_waveforms_2, discriminant_direction)
             
@@ -275,9 +296,14 @@ def create_autocorrelograms_view(
 ):
     """Create a view with autocorrelograms for each unit."""
     num_units = np.max(spike_labels)
+    # Group spikes by label in one pass (stable, so each unit's spikes stay
+    # in time order) instead of masking the full arrays once per unit
+    spike_order = np.argsort(spike_labels, kind='stable')
+    sorted_spike_times = spike_times[spike_order]
+    unit_starts = np.searchsorted(spike_labels[spike_order], np.arange(1, num_units + 2))
     autocorrelograms = []
     for unit_id in range(1, num_units + 1):
-        spike_train_sec = spike_times[spike_labels == unit_id]
+        spike_train_sec = sorted_spike_times[unit_starts[unit_id - 1]:unit_starts[unit_id]]
         if len(spike_train_sec) < 2:
             continue
         bin_edges_sec, bin_counts = compute_unit_autocorrelogram(
@@ -317,30 +343,31 @@ def compute_unit_autocorrelogram(spike_train, bin_size_ms=1.0, window_ms=100.0):
     bin_edges_msec = np.array(
         (np.arange(num_bins + 1) - num_bins / 2) * bin_size_ms, dtype=np.float32
     )
-    bin_counts = np.zeros((num_bins,), dtype=np.int32)
-    times1 = spike_train
-    offset = 1
-    while True:
-        if offset >= len(times1):
-            break
-        deltas_msec = (
-            (times1[offset:] - times1[:-offset])
-            * 1000.0
-        )
-        deltas_msec = deltas_msec[deltas_msec <= bin_edges_msec[-1]]
-        if len(deltas_msec) == 0:
-            break
-        for i in range(num_bins_half):
-            start_msec = bin_edges_msec[num_bins_half - 1 + i]
-            end_msec = bin_edges_msec[num_bins_half + i]
-            ct = len(
-                deltas_msec[(start_msec <= deltas_msec) & (deltas_msec < end_msec)]
-            )
-            bin_counts[num_bins_half - 1 + i] += ct
-            bin_counts[num_bins_half - 1 - i] += ct
-        offset = offset + 1
+    times1 = np.asarray(spike_train)
+    bin_counts = _accumulate_autocorrelogram(
+        times1, times1.dtype.type(1000.0), bin_edges_msec, num_bins_half
+    )
     return (bin_edges_msec / 1000).astype(np.float32), bin_counts
 
+@njit(cache=True)
+def _accumulate_autocorrelogram(times1, msec_per_sec, bin_edges_msec, num_bins_half):
+    # times1 is sorted, so for each spike only the following spikes within
+    # the window need to be visited
+    num_bins = len(bin_edges_msec) - 1
+    bin_counts = np.zeros((num_bins,), dtype=np.int32)
+    for i in range(len(times1)):
+        for j in range(i + 1, len(times1)):
+            delta_msec = (times1[j] - times1[i]) * msec_per_sec
+            if delta_msec > bin_edges_msec[-1]:
+                break
+            # bin k such that bin_edges_msec[k] <= delta_msec < bin_edges_msec[k + 1]
+            k = np.searchsorted(bin_edges_msec, delta_msec, side='right') - 1
+            if k < num_bins_half - 1 or k >= num_bins:
+                continue
+            bin_counts[k] += 1
+            bin_counts[2 * (num_bins_half - 1) - k] += 1
+    return bin_counts
+
 def create_spike_frames_movie(
     *,
     shifted_data: np.ndarray,
@@ -403,24 +430,39 @@ def create_spike_frames_movie(
 
 def generate_time_series_preview(
     *,
-    data_path: str,
-    channel_indices: list,
+    data_path: Optional[str] = None,
+    data: Optional[np.ndarray] = None,
+    channel_indices: Union[list, range, slice],
     sampling_frequency: float,
     num_channels: int,
     high_activity_intervals: list,
     name: str
 ):
-    """Generate a figpack TimeSeriesGraph preview with high activity intervals."""
+    """Generate a figpack TimeSeriesGraph preview with high activity intervals.
+
+    Pass either data_path (int16 file to read) or already-loaded data.
+    channel_indices may be a slice or range, which selects the channels as a
+    view instead of copying them.
+    """
+    if data is None:
+        data = np.memmap(data_path, dtype=np.int16, mode='r').reshape(-1, num_channels)
+    # A slice or range of channels can be taken as a view (no copy of the columns)
+    if isinstance(channel_indices, range):
+        channel_indices = slice(channel_indices.start, channel_indices.stop, channel_indices.step)
+    elif not isinstance(channel_indices, slice) and len(channel_indices) > 0 and list(channel_indices) == list(range(channel_indices[0], channel_indices[0] + len(channel_indices))):
+        channel_indices = slice(channel_indices[0], channel_indices[0] + len(channel_indices))
+    channel_data = data[:, channel_indices]
     V = vv.TimeseriesGraph()
     V.add_uniform_series(
         name=name,
         start_time_sec=0,
         sampling_frequency_hz=sampling_frequency,
-        data=np.fromfile(data_path, dtype=np.int16).reshape(-1, num_channels)[:, channel_indices],
+        data=channel_data,
         auto_channel_spacing=50
     )
-    t_start = np.array([i[0] for i in high_activity_intervals], dtype=np.float32)
-    t_end = np.array([i[1] for i in high_activity_intervals], dtype=np.float32)
+    intervals = np.asarray(high_activity_intervals, dtype=np.float32).reshape(-1, 2)
+    t_start = intervals[:, 0]
+    t_end = intervals[:, 1]
     V.add_interval_series(
         name="High Activity",
         t_start=t_start,
@@ -21,10 +21,7 @@ def detect_high_activity_intervals(data_path, *, num_channels: int, num_frames:
     num_segments = (num_timesteps + segment_size - 1) // segment_size
     
     # Compute variance for each segment
-    variances = np.zeros(num_segments)
-    for i in range(num_segments):
-        segment_start = i * segment_size
-        variances[i] = compute_segment_variance(filtered_data, segment_start, segment_size)
+    variances = compute_segment_variances(filtered_data, segment_size)
     
     # Calculate baseline variance as the specified percentile of segment variances
     baseline_variance = np.percentile(variances, baseline_percentile)
@@ -48,32 +45,61 @@ def detect_high_activity_intervals(data_path, *, num_channels: int, num_frames:
     
     return time_intervals
 
-def compute_segment_variance(data, segment_start, segment_size):
+def compute_segment_variances(data, segment_size, max_batch_bytes=64 * 1024 * 1024):
     """
-    Compute average per-channel variance for a single segment.
+    Compute average per-channel variance for each consecutive segment.
     
     Parameters:
     -----------
     data : np.ndarray
-        Filtered data of shape (num_timesteps, num_channels)
-    segment_start : int
-        Starting index of segment
+        Filtered int16 data of shape (num_timesteps, num_channels)
     segment_size : int
-        Number of samples in segment
+        Number of samples in segment (the last segment may be shorter)
+    max_batch_bytes : int
+        Approximate cap on the working memory per batch of segments
     
     Returns:
     --------
-    float
-        Average per-channel variance across the segment
+    np.ndarray
+        Average per-channel variance for each segment
     """
-    segment_end = min(segment_start + segment_size, data.shape[0])
-    segment_data = data[segment_start:segment_end, :]
+    num_timesteps, num_channels = data.shape
+    num_full_segments = num_timesteps // segment_size
+    num_segments = (num_timesteps + segment_size - 1) // segment_size
+    variances = np.zeros(num_segments)
     
-    # Compute variance for each channel, then average across channels
-    channel_variances = np.var(segment_data, axis=0)
-    avg_variance = np.mean(channel_variances)
+    # Full segments: reshape batches to (segments, segment_size, channels)
+    # and reduce in one call per batch
+    segments_per_batch = max(1, max_batch_bytes // (segment_size * num_channels * 4))
+    for i0 in range(0, num_full_segments, segments_per_batch):
+        i1 = min(i0 + segments_per_batch, num_full_segments)
+        block = np.asarray(data[i0 * segment_size:i1 * segment_size, :]).reshape(i1 - i0, segment_size, num_channels)
+        variances[i0:i1] = _mean_channel_variances(block)
+    
+    # Remainder segment
+    if num_segments > num_full_segments:
+        segment_data = np.asarray(data[num_full_segments * segment_size:, :])
+        variances[-1] = _mean_channel_variances(segment_data[np.newaxis])[0]
     
-    return avg_variance
+    return variances
+
+def _mean_channel_variances(block):
+    """
+    Average per-channel variance for each segment of an int16 block of shape
+    (num_segments, segment_size, num_channels).
+
+    Uses var = E[x^2] - E[x]^2 with exact integer sums (int32 squares,
+    int64 accumulation), so the data is read in one pass without a float64
+    copy.
+    """
+    n = block.shape[1]
+    sums = block.sum(axis=1, dtype=np.int64)
+    squares = block.astype(np.int32)
+    np.multiply(squares, squares, out=squares)
+    sums_sq = squares.sum(axis=1, dtype=np.int64)
+    # Compute variance for each channel, then average across channels
+    channel_variances = (sums_sq - sums * sums / n) / n
+    return channel_variances.mean(axis=1)
 
 def group_adjacent_segments(high_activity_flags, min_consecutive=3):
     """
@@ -91,26 +117,14 @@ def group_adjacent_segments(high_activity_flags, min_consecutive=3):
     list of tuples
         List of (start_segment, end_segment) tuples (inclusive)
     """
-    intervals = []
-    in_interval = False
-    start_segment = 0
-    
-    for i, is_high in enumerate(high_activity_flags):
-        if is_high and not in_interval:
-            # Start of new interval
-            start_segment = i
-            in_interval = True
-        elif not is_high and in_interval:
-            # End of interval - check if it meets minimum length
-            interval_length = i - start_segment
-            if interval_length >= min_consecutive:
-                intervals.append((start_segment, i - 1))
-            in_interval = False
-    
-    # Handle case where last segment is high activity
-    if in_interval:
-        interval_length = len(high_activity_flags) - start_segment
-        if interval_length >= min_consecutive:
-            intervals.append((start_segment, len(high_activity_flags) - 1))
+    # Find runs of high activity segments: +1 at run starts, -1 one past run ends
+    flags = np.asarray(high_activity_flags, dtype=np.int8)
+    edges = np.diff(np.concatenate(([0], flags, [0])))
+    run_starts = np.flatnonzero(edges == 1)
+    run_ends = np.flatnonzero(edges == -1)
+    
+    # Keep runs that meet the minimum length
+    keep = (run_ends - run_starts) >= min_consecutive
+    intervals = list(zip(run_starts[keep].tolist(), (run_ends[keep] - 1).tolist()))
     
     return intervals
@@ -1,8 +1,9 @@
 import os
-from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
 from functools import partial
 
 import numpy as np
+from numba import njit, types
 
 
 def optimize_time_shift(
@@ -24,38 +25,42 @@ def optimize_time_shift(
     )
     print(f"Size of filtered data file: {num_timesteps * num_channels * 2} bytes")
 
-    # First stage: broad search
-    # shift is in seconds per spatial unit
-    # fov is around 400 spatial units
-    # c_x = 1 corresponds to 20000 * 400 samples shift across the array
-    # c_x = 1e-6 corresponds to 8 samples shift across the array
-    c_x_range = np.linspace(-2e-6, 2e-6, 21)  # seconds per spatial unit
-    c_y_range = np.linspace(-2e-6, 2e-6, 21)  # seconds per spatial unit
-
-    optimization_results = optimize_time_shift_coefficients(
-        filtered_data=filtered_data,
-        electrode_coords=electrode_coords,
-        sampling_frequency_hz=20000.0,
-        duration_sec=0.5,
-        c_x_range=c_x_range,
-        c_y_range=c_y_range,
-    )
+    # Both stages share one worker pool
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        # First stage: broad search
+        # shift is in seconds per spatial unit
+        # fov is around 400 spatial units
+        # c_x = 1 corresponds to 20000 * 400 samples shift across the array
+        # c_x = 1e-6 corresponds to 8 samples shift across the array
+        c_x_range = np.linspace(-2e-6, 2e-6, 21)  # seconds per spatial unit
+        c_y_range = np.linspace(-2e-6, 2e-6, 21)  # seconds per spatial unit
+
+        optimization_results = optimize_time_shift_coefficients(
+            filtered_data=filtered_data,
+            electrode_coords=electrode_coords,
+            sampling_frequency_hz=20000.0,
+            duration_sec=0.5,
+            c_x_range=c_x_range,
+            c_y_range=c_y_range,
+            executor=executor,
+        )
 
-    # Second stage: refined search around best coefficients
-    print(f"  Refining optimization around best coefficients...")
-    c_x_best = optimization_results["best_c_x"]
-    c_y_best = optimization_results["best_c_y"]
-    c_x_range = np.linspace(c_x_best - 5e-7, c_x_best + 5e-7, 21)
-    c_y_range = np.linspace(c_y_best - 5e-7, c_y_best + 5e-7, 21)
-
-    optimization_results = optimize_time_shift_coefficients(
-        filtered_data=filtered_data,
-        electrode_coords=electrode_coords,
-        sampling_frequency_hz=sampling_frequency_hz,
-        duration_sec=duration_sec,
-        c_x_range=c_x_range,
-        c_y_range=c_y_range,
-    )
+        # Second stage: refined search around best coefficients
+        print(f"  Refining optimization around best coefficients...")
+        c_x_best = optimization_results["best_c_x"]
+        c_y_best = optimization_results["best_c_y"]
+        c_x_range = np.linspace(c_x_best - 5e-7, c_x_best + 5e-7, 21)
+        c_y_range = np.linspace(c_y_best - 5e-7, c_y_best + 5e-7, 21)
+
+        optimization_results = optimize_time_shift_coefficients(
+            filtered_data=filtered_data,
+            electrode_coords=electrode_coords,
+            sampling_frequency_hz=sampling_frequency_hz,
+            duration_sec=duration_sec,
+            c_x_range=c_x_range,
+            c_y_range=c_y_range,
+            executor=executor,
+        )
 
     print(
         f"  Optimal coefficients: c_x={optimization_results['best_c_x']:.6e}, "
@@ -78,9 +83,13 @@ def optimize_time_shift_coefficients(
     duration_sec,
     c_x_range,
     c_y_range,
+    executor=None,
 ):
     """
     Optimize time shift coefficients by maximizing variance of averaged channels.
+
+    If executor is given it is used for the grid search (so callers running
+    several searches can reuse one pool); otherwise a pool is created here.
     """
     # Default ranges if not provided
     if c_x_range is None:
@@ -91,7 +100,8 @@ def optimize_time_shift_coefficients(
     # Extract data segment
     num_samples = int(duration_sec * sampling_frequency_hz)
     num_samples = min(num_samples, filtered_data.shape[0])
-    data_segment = filtered_data[:num_samples, :]
+    # Read the segment into memory once; the worker threads share it
+    data_segment = np.ascontiguousarray(filtered_data[:num_samples, :])
 
     print(f"\nOptimizing time shift coefficients by maximizing variance:")
     print(f"  Data segment: {num_samples} samples ({duration_sec} sec)")
@@ -110,26 +120,45 @@ def optimize_time_shift_coefficients(
     
     # Create list of all (c_x, c_y) combinations
     combinations = [(c_x, c_y) for c_x in c_x_range for c_y in c_y_range]
-    total_combinations = len(combinations)
+
+    # Integer per-channel shifts for every combination, shape
+    # (len(c_x_range) * len(c_y_range), num_channels). Neighboring grid points
+    # often round to the same shifts, so only the distinct rows are scored
+    c_x_grid = np.asarray(c_x_range, dtype=np.float64)[:, None, None]
+    c_y_grid = np.asarray(c_y_range, dtype=np.float64)[None, :, None]
+    all_time_shifts_samples = _compute_time_shifts_samples(
+        electrode_coords, sampling_frequency_hz, c_x_grid, c_y_grid
+    ).reshape(len(combinations), -1)
+    unique_time_shifts_samples, inverse = np.unique(
+        all_time_shifts_samples, axis=0, return_inverse=True
+    )
+    inverse = inverse.reshape(-1)
+    total_unique = len(unique_time_shifts_samples)
     
     # Create worker function with fixed parameters
     worker_func = partial(
         _compute_score_worker,
         data_segment=data_segment,
-        electrode_coords=electrode_coords,
-        sampling_frequency_hz=sampling_frequency_hz
     )
     
-    # Parallelize computation using ProcessPoolExecutor with progress reporting
-    print(f"  Processing {total_combinations} combinations in parallel...")
-    with ProcessPoolExecutor() as executor:
-        scores = []
+    # Parallelize computation with threads (the score kernel releases the
+    # GIL, so nothing is pickled or copied to workers) with progress reporting
+    print(f"  Processing {total_unique} distinct shift patterns for {len(combinations)} combinations in parallel...")
+    own_executor = executor is None
+    if own_executor:
+        executor = ThreadPoolExecutor(max_workers=os.cpu_count())
+    try:
+        unique_scores = []
         completed = 0
-        for score in executor.map(worker_func, combinations):
-            scores.append(score)
+        for score in executor.map(worker_func, unique_time_shifts_samples):
+            unique_scores.append(score)
             completed += 1
-            if completed % 50 == 0 or completed == total_combinations:
-                print(f"    Progress: {completed}/{total_combinations} ({100*completed//total_combinations}%)")
+            if completed % 50 == 0 or completed == total_unique:
+                print(f"    Progress: {completed}/{total_unique} ({100*completed//total_unique}%)")
+    finally:
+        if own_executor:
+            executor.shutdown()
+    scores = [unique_scores[k] for k in inverse]
     
     # Process results
     for (c_x, c_y), score in zip(combinations, scores):
@@ -172,45 +201,126 @@ def optimize_time_shift_coefficients(
     return results
 
 
-def _compute_score_worker(combination, data_segment, electrode_coords, sampling_frequency_hz):
+def _compute_score_worker(time_shifts_samples, data_segment):
     """
     Worker function for parallel processing of score computation.
     
     Parameters:
     -----------
-    combination : tuple
-        (c_x, c_y) tuple
+    time_shifts_samples : np.ndarray
+        Per-channel time shifts in samples (int32)
     data_segment : np.ndarray
         Data segment to process
-    electrode_coords : list
-        Electrode coordinates
-    sampling_frequency_hz : float
-        Sampling frequency
         
     Returns:
     --------
     float
         Computed score
     """
-    c_x, c_y = combination
-    return compute_score(data_segment, electrode_coords, c_x, c_y, sampling_frequency_hz)
+    return _compute_score_for_time_shifts(data_segment, time_shifts_samples)
 
 def compute_score(data, electrode_coords, c_x, c_y, sampling_frequency_hz):
-    # Apply time shifts
-    shifted_data = apply_time_shifts_for_optimization(
-        data, electrode_coords, sampling_frequency_hz, c_x, c_y
+    # Calculate time shifts in samples for each channel
+    time_shifts_samples = _compute_time_shifts_samples(
+        electrode_coords, sampling_frequency_hz, c_x, c_y
     )
+    return _compute_score_for_time_shifts(data, time_shifts_samples)
+
+
+def _compute_score_for_time_shifts(data, time_shifts_samples):
+    num_timesteps = data.shape[0]
 
-    if shifted_data.size == 0:
+    # Crop region that avoids the wrap-around of the shifted channels
+    crop_start = max(0, int(time_shifts_samples.max()))
+    crop_end = num_timesteps - max(0, -int(time_shifts_samples.min()))
+
+    if crop_start >= crop_end:
         # Invalid shift range
         return float("inf")
 
-    # Average across all channels
-    averaged_data = np.mean(shifted_data.astype(np.float32), axis=1)
-
-    # Compute and return variance
+    # Shift, average across all channels and compute the variance in one pass
     # Higher variance indicates better alignment (synchronized spikes sum constructively)
-    return np.var(averaged_data)
+    time_shifts_samples = np.ascontiguousarray(time_shifts_samples, dtype=np.int32)
+    if data.dtype == np.int16:
+        return _shifted_channel_mean_variance(
+            np.ascontiguousarray(data), time_shifts_samples, crop_start, crop_end
+        )
+    # Any other dtype (e.g. float data) is summed in float64, never cast to int16
+    return _shifted_channel_mean_variance_float(
+        np.asarray(data), time_shifts_samples, crop_start, crop_end
+    )
+
+
+def _compute_time_shifts_samples(electrode_coords, sampling_frequency_hz, c_x, c_y):
+    """
+    Per-channel time shifts in samples (int32) for t = c_x * x + c_y * y.
+
+    c_x and c_y may be arrays that broadcast against the channel axis (the
+    last axis of the result), to get the shifts for many coefficients at once.
+    """
+    coords = np.asarray(electrode_coords, dtype=np.float64)
+    time_shifts_sec = c_x * coords[:, 0] + c_y * coords[:, 1]
+    return np.round(time_shifts_sec * sampling_frequency_hz).astype(np.int32)
+
+
+# Compiled eagerly for the one layout used (C-contiguous int16 data, writable
+# or read-only as from a memmap, and int32 shifts), so there is no JIT pause
+# on the first call and the inner loop is specialized for unit-stride rows
+@njit(
+    [
+        types.float64(types.Array(types.int16, 2, "C", readonly=readonly), types.int32[::1], types.int64, types.int64)
+        for readonly in (False, True)
+    ],
+    nogil=True,
+    fastmath=True,
+    cache=True,
+)
+def _shifted_channel_mean_variance(data, time_shifts_samples, crop_start, crop_end):
+    """
+    Variance over time of the channel mean of the shifted data, restricted
+    to [crop_start, crop_end).
+
+    Channel ch of the shifted data at time t is data[t - shift[ch], ch], so
+    the shifted array is never materialized. Runs without the GIL so that
+    grid points can be scored concurrently from threads.
+
+    The int16 samples are summed across channels exactly in integers (int32
+    per row, which cannot overflow for fewer than 65536 channels) and only
+    the final moments are taken in float64; dividing by the (fixed) number
+    of channels is applied once at the end.
+    """
+    num_channels = data.shape[1]
+    num_timesteps = crop_end - crop_start
+    acc = np.int64(0)  # exact sum of the row sums
+    acc2 = 0.0
+    for t in range(crop_start, crop_end):
+        s = np.int32(0)
+        for ch in range(num_channels):
+            s += np.int32(data[t - time_shifts_samples[ch], ch])
+        acc += s
+        acc2 += np.float64(s) * s
+    mean = acc / num_timesteps
+    return (acc2 / num_timesteps - mean * mean) / (num_channels * num_channels)
+
+
+@njit(nogil=True, fastmath=True, cache=True)
+def _shifted_channel_mean_variance_float(data, time_shifts_samples, crop_start, crop_end):
+    """
+    Same as _shifted_channel_mean_variance for data of any numeric dtype,
+    accumulating in float64.
+    """
+    num_channels = data.shape[1]
+    num_timesteps = crop_end - crop_start
+    acc = 0.0
+    acc2 = 0.0
+    for t in range(crop_start, crop_end):
+        s = 0.0
+        for ch in range(num_channels):
+            s += np.float64(data[t - time_shifts_samples[ch], ch])
+        acc += s
+        acc2 += s * s
+    mean = acc / num_timesteps
+    return (acc2 / num_timesteps - mean * mean) / (num_channels * num_channels)
 
 
 def apply_time_shifts_for_optimization(
@@ -219,25 +329,13 @@ def apply_time_shifts_for_optimization(
     num_timesteps, num_channels = data.shape
 
     # Calculate time shifts in samples for each channel
-    time_shifts_samples = []
-    for ch in range(num_channels):
-        x, y = electrode_coords[ch]
-        time_shift_sec = c_x * x + c_y * y
-        time_shift_samples = int(round(time_shift_sec * sampling_frequency_hz))
-        time_shifts_samples.append(time_shift_samples)
+    time_shifts_samples = _compute_time_shifts_samples(
+        electrode_coords, sampling_frequency_hz, c_x, c_y
+    )
 
     # Find min and max shifts to determine crop region
-    min_shift = min(time_shifts_samples)
-    max_shift = max(time_shifts_samples)
-
-    # Allocate output array (same size initially)
-    shifted_data = np.zeros_like(data, dtype=data.dtype)
-
-    # Apply shifts by rolling each channel
-    for ch in range(num_channels):
-        shift = time_shifts_samples[ch]
-        # Roll shifts the data: positive shift moves data forward in time
-        shifted_data[:, ch] = np.roll(data[:, ch], shift)
+    min_shift = int(time_shifts_samples.min())
+    max_shift = int(time_shifts_samples.max())
 
     # Crop to avoid edge effects
     # Remove the wrap-around region at both ends
@@ -248,12 +346,17 @@ def apply_time_shifts_for_optimization(
         # Return empty array if shifts are too large
         return np.array([])
 
-    cropped_data = shifted_data[crop_start:crop_end, :]
+    # Only the cropped region is allocated; within it, shifted channel ch at
+    # time t is data[t - shift, ch], so each channel is a single slice copy
+    cropped_data = np.empty((crop_end - crop_start, num_channels), dtype=data.dtype)
+    for ch in range(num_channels):
+        shift = time_shifts_samples[ch]
+        cropped_data[:, ch] = data[crop_start - shift:crop_end - shift, ch]
 
     return cropped_data
 
 
-def apply_time_shifts(data, electrode_coords, sampling_frequency_hz, c_x, c_y):
+def apply_time_shifts(data, electrode_coords, sampling_frequency_hz, c_x, c_y, out=None, block_frames=65536):
     """
     Apply time shifts to channels based on electrode coordinates.
     Time shift formula: t = c_x * x + c_y * y (in seconds)
@@ -273,6 +376,12 @@ def apply_time_shifts(data, electrode_coords, sampling_frequency_hz, c_x, c_y):
         Coefficient for x coordinate
     c_y : float
         Coefficient for y coordinate
+    out : np.ndarray, optional
+        Array of the same shape as data to write the result into (e.g. a
+        writable memmap of the output file)
+    block_frames : int
+        The output is filled in blocks of this many frames, so a memmapped
+        output is written sequentially
 
     Returns:
     --------
@@ -284,16 +393,13 @@ def apply_time_shifts(data, electrode_coords, sampling_frequency_hz, c_x, c_y):
     print(f"Applying time shifts with c_x={c_x}, c_y={c_y}...")
 
     # Calculate time shifts in samples for each channel
-    time_shifts_samples = []
-    for ch in range(num_channels):
-        x, y = electrode_coords[ch]
-        time_shift_sec = c_x * x + c_y * y
-        time_shift_samples = int(round(time_shift_sec * sampling_frequency_hz))
-        time_shifts_samples.append(time_shift_samples)
+    time_shifts_samples = _compute_time_shifts_samples(
+        electrode_coords, sampling_frequency_hz, c_x, c_y
+    )
 
     # Find min and max shifts to determine crop region
-    min_shift = min(time_shifts_samples)
-    max_shift = max(time_shifts_samples)
+    min_shift = int(time_shifts_samples.min())
+    max_shift = int(time_shifts_samples.max())
 
     print(
         f"Time shifts range: [{min_shift}, {max_shift}] samples "
@@ -301,12 +407,22 @@ def apply_time_shifts(data, electrode_coords, sampling_frequency_hz, c_x, c_y):
     )
 
     # Allocate output array (same size initially)
-    shifted_data = np.zeros_like(data, dtype=data.dtype)
-
-    # Apply shifts by rolling each channel
-    for ch in range(num_channels):
-        shift = time_shifts_samples[ch]
-        # Roll shifts the data: positive shift moves data forward in time
-        shifted_data[:, ch] = np.roll(data[:, ch], shift)
+    if out is None:
+        out = np.empty(data.shape, dtype=data.dtype)
+    shifted_data = out
+
+    # Apply shifts channel by channel, equivalent to np.roll but copying
+    # slices directly instead of allocating a rolled column
+    # Positive shift moves data forward in time: output frame t of channel ch
+    # is input frame (t - shift) mod num_timesteps
+    shifts = [int(s) % num_timesteps for s in time_shifts_samples] if num_timesteps > 0 else []
+    for t0 in range(0, num_timesteps, block_frames):
+        t1 = min(t0 + block_frames, num_timesteps)
+        for ch, shift in enumerate(shifts):
+            src0 = (t0 - shift) % num_timesteps
+            # Frames of the block before the source wraps around
+            n1 = min(t1 - t0, num_timesteps - src0)
+            shifted_data[t0:t0 + n1, ch] = data[src0:src0 + n1, ch]
+            shifted_data[t0 + n1:t1, ch] = data[:t1 - t0 - n1, ch]
 
     return shifted_data
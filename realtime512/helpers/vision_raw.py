@@ -25,7 +25,8 @@ class RawTraces:
             end_sample (int): Ending sample index (default: None, reads till the end).
 
         Returns:
-            np.ndarray: Loaded data as a NumPy array of shape [electrodes, samples].
+            np.ndarray: Loaded data as a NumPy array of shape [samples, electrodes],
+            in the file's native dtype.
         """
         with bin2py.PyBinFileReader(self.binpath, chunk_samples=RW_BLOCKSIZE, is_row_major=True) as pbfr:
             # Determine the number of electrodes and total samples
@@ -42,7 +43,7 @@ class RawTraces:
                 end_sample = total_samples
 
             # Validate sample range
-            if start_sample < 0 or end_sample > total_samples or start_sample >= end_sample:
+            if start_sample < 0 or end_sample > total_samples or start_sample > end_sample:
                 raise ValueError("Invalid start_sample or end_sample range.")
 
             query_samples = end_sample - start_sample
@@ -51,30 +52,29 @@ class RawTraces:
                 print(f'Queried time: {query_samples / SAMPLE_RATE} seconds')
                 print(f'From {start_sample / SAMPLE_RATE} to {end_sample / SAMPLE_RATE} seconds')
                 
-            # Preallocate array for the data
-            data = np.zeros((n_channels, query_samples), dtype=np.float32)
+            # Array for the data in the native dtype (bin2py returns int16
+            # samples), directly in the [samples, electrodes] layout. An empty
+            # range gives empty arrays.
+            data = np.empty((query_samples, n_channels), dtype=np.int16)
 
-            ttl_times_buffer = []
-            ttl_samples = np.zeros((query_samples,), dtype=np.float32)
+            ttl_times_buffer = [np.empty(0, dtype=np.int64)]
+            ttl_samples = np.empty(0, dtype=np.int16)
             # Read data in chunks
             for start_idx in range(start_sample, end_sample, RW_BLOCKSIZE):
                 n_samples_to_get = min(RW_BLOCKSIZE, end_sample - start_idx)
                 chunk = pbfr.get_data(start_idx, n_samples_to_get)
 
                 # Extract TTL data (channel 0) and compute TTL times
-                ttl_samples = chunk[0, :]
-                below_threshold = (ttl_samples < -TTL_THRESHOLD)
-                above_threshold = np.logical_not(below_threshold)
-                below_to_above = np.logical_and.reduce([
-                    below_threshold[:-1],
-                    above_threshold[1:]
-                ])
-                trigger_indices = np.argwhere(below_to_above) + start_idx
-                ttl_times_buffer.append(trigger_indices[:, 0])
+                # A trigger is a below-threshold sample followed by one that is not
+                below_threshold = (chunk[0, :] < -TTL_THRESHOLD)
+                trigger_indices = np.flatnonzero(below_threshold[:-1] > below_threshold[1:]) + start_idx
+                ttl_times_buffer.append(trigger_indices)
 
                 # Populate the data matrix (exclude channel 0)
-                data[:, start_idx - start_sample:start_idx - start_sample + n_samples_to_get] = chunk[1:, :]
+                data[start_idx - start_sample:start_idx - start_sample + n_samples_to_get, :] = chunk[1:, :].T
                 # ttl_samples[start_idx - start_sample:start_idx - start_sample + n_samples_to_get] = chunk[0, :]
+                # TTL channel of the last chunk read
+                ttl_samples = chunk[0, :]
 
             # Concatenate TTL times
             ttl_times = np.concatenate(ttl_times_buffer, axis=0)
@@ -83,8 +83,8 @@ class RawTraces:
             print(f'Data shape: {data.shape}')
         # print(f'TTL times shape: {ttl_times.shape}')
         
-        # Store as [samples, electrodes]
-        self.data = data.T
+        # Stored as [samples, electrodes]
+        self.data = data
         self.ttl_times = ttl_times
         self.ttl_samples = ttl_samples
 
@@ -98,3 +98,16 @@ def load_raw_bin_file(input_path: str, num_channels: int, b_np: bool=False) -> n
     rt = RawTraces(input_path)
     rt.load_bin_data(verbose=True)
     return rt.data
+
+
+def get_raw_bin_num_samples(input_path: str) -> int:
+    """Return the number of samples in a raw .bin file without loading it."""
+    with bin2py.PyBinFileReader(input_path, chunk_samples=RW_BLOCKSIZE, is_row_major=True) as pbfr:
+        return pbfr.length
+
+
+def load_raw_bin_chunk(input_path: str, start_sample: int, end_sample: int) -> np.ndarray:
+    """Load samples [start_sample, end_sample) of a raw .bin file as [samples, electrodes]."""
+    rt = RawTraces(input_path)
+    rt.load_bin_data(start_sample=start_sample, end_sample=end_sample)
+    return rt.data
@@ -1,11 +1,72 @@
 """API handlers for the realtime512 serve command."""
 
 import os
+import gzip
 import json
+import mimetypes
 import numpy as np
-import yaml
-from flask import jsonify, send_file, send_from_directory, request, Response
-from io import BytesIO
+from urllib.parse import quote
+from flask import current_app, jsonify, send_file, send_from_directory, request, Response
+from werkzeug.security import safe_join
+from werkzeug.wsgi import wrap_file
+
+from .file_cache import load_config, load_json, load_yaml
+
+
+class _RangeReader:
+    """
+    File-like reader over num_bytes of a file starting at byte_offset.
+
+    It exposes fileno() so that WSGI servers with sendfile support (e.g.
+    gunicorn) can send the range from the current file position zero-copy,
+    bounded by the response Content-Length; other servers use read().
+    """
+
+    def __init__(self, path, byte_offset, num_bytes):
+        self._f = open(path, "rb")
+        self._f.seek(byte_offset)
+        self._remaining = num_bytes
+
+    def read(self, size=-1):
+        if self._remaining <= 0:
+            return b""
+        if size is None or size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._f.read(size)
+        self._remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self._f.fileno()
+
+    def close(self):
+        self._f.close()
+
+
+def _x_accel_redirect(file_path, mimetype, headers=None):
+    """
+    When the app is configured with X_ACCEL_REDIRECT_PREFIX (serving behind
+    nginx), return a response that hands file_path (inside the experiment
+    directory) to nginx to send; otherwise None. nginx keeps this response's
+    Content-Type, so when mimetype is None it is guessed from the file name
+    (as send_file does).
+    """
+    prefix = current_app.config.get("X_ACCEL_REDIRECT_PREFIX")
+    if not prefix:
+        return None
+    relative_path = os.path.relpath(file_path, os.getcwd()).replace(os.sep, "/")
+    if mimetype is None:
+        mimetype = mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+    response = Response(mimetype=mimetype, headers=headers)
+    response.headers["X-Accel-Redirect"] = prefix.rstrip("/") + "/" + quote(relative_path)
+    return response
+
+
+def _list_dir_names(dir_path):
+    """Set of entry names in a directory (empty if it does not exist)."""
+    if not os.path.isdir(dir_path):
+        return set()
+    return set(os.listdir(dir_path))
 
 
 def get_config_handler():
@@ -14,8 +75,7 @@ def get_config_handler():
     if not os.path.exists(config_path):
         return jsonify({"error": "Configuration file not found"}), 404
     
-    with open(config_path, "r") as f:
-        config = yaml.safe_load(f)
+    config = load_config(config_path)
     
     return jsonify(config)
 
@@ -28,51 +88,69 @@ def get_files_handler():
     if not os.path.exists(raw_dir):
         return jsonify({"error": "raw/ directory not found"}), 404
     
-    bin_files = [fname for fname in os.listdir(raw_dir) if fname.endswith(".bin")]
+    # One directory scan gives the .bin names and their sizes
+    bin_file_sizes = {}
+    with os.scandir(raw_dir) as entries:
+        for entry in entries:
+            if entry.name.endswith(".bin") and entry.is_file():
+                bin_file_sizes[entry.name] = entry.stat().st_size
+    bin_files = list(bin_file_sizes)
+    
+    # List each computed directory once instead of stat-ing every output
+    filt_names = _list_dir_names(os.path.join(computed_dir, "filt"))
+    shifted_names = _list_dir_names(os.path.join(computed_dir, "shifted"))
+    templates_names = _list_dir_names(os.path.join(computed_dir, "templates"))
+    high_activity_names = _list_dir_names(os.path.join(computed_dir, "high_activity"))
+    stats_names = _list_dir_names(os.path.join(computed_dir, "stats"))
+    preview_names = _list_dir_names(os.path.join(computed_dir, "preview"))
+    coarse_sorting_files = {"templates.npy", "spike_times.npy", "spike_labels.npy", "spike_amplitudes.npy"}
+    
+    # Load config once to get n_channels and sampling_frequency
+    config_path = os.path.join(os.getcwd(), "realtime512.yaml")
+    config = load_config(config_path) if os.path.exists(config_path) else None
+    if config is not None:
+        n_channels = config.get("n_channels", 512)
+        sampling_frequency = config.get("sampling_frequency", 20000)
     
     files_info = []
     for fname in sorted(bin_files):
         # Check coarse sorting - need all 4 files to exist
         coarse_sorting_dir = os.path.join(computed_dir, "coarse_sorting", fname)
-        has_coarse_sorting = (
-            os.path.exists(os.path.join(coarse_sorting_dir, "templates.npy")) and
-            os.path.exists(os.path.join(coarse_sorting_dir, "spike_times.npy")) and
-            os.path.exists(os.path.join(coarse_sorting_dir, "spike_labels.npy")) and
-            os.path.exists(os.path.join(coarse_sorting_dir, "spike_amplitudes.npy"))
-        )
+        has_coarse_sorting = coarse_sorting_files <= _list_dir_names(coarse_sorting_dir)
         
         file_info = {
             "filename": fname,
-            "has_filt": os.path.exists(os.path.join(computed_dir, "filt", fname + ".filt")),
-            "has_shifted": os.path.exists(os.path.join(computed_dir, "shifted", fname + ".shifted")),
+            "has_filt": (fname + ".filt") in filt_names,
+            "has_shifted": (fname + ".shifted") in shifted_names,
             "has_coarse_sorting": has_coarse_sorting,
-            "has_templates": os.path.exists(os.path.join(computed_dir, "templates", fname + ".templates.npy")),
-            "has_high_activity": os.path.exists(os.path.join(computed_dir, "high_activity", fname + ".high_activity.json")),
-            "has_stats": os.path.exists(os.path.join(computed_dir, "stats", fname + ".stats.json")),
-            "has_preview": os.path.exists(os.path.join(computed_dir, "preview", fname + ".figpack")),
+            "has_templates": (fname + ".templates.npy") in templates_names,
+            "has_high_activity": (fname + ".high_activity.json") in high_activity_names,
+            "has_stats": (fname + ".stats.json") in stats_names,
+            "has_preview": (fname + ".figpack") in preview_names,
         }
         
         # Get file size and duration
-        raw_path = os.path.join(raw_dir, fname)
-        if os.path.exists(raw_path):
-            file_size = os.path.getsize(raw_path)
-            file_info["size_bytes"] = file_size
-            
-            # Load config to get n_channels and sampling_frequency
-            config_path = os.path.join(os.getcwd(), "realtime512.yaml")
-            if os.path.exists(config_path):
-                with open(config_path, "r") as f:
-                    config = yaml.safe_load(f)
-                n_channels = config.get("n_channels", 512)
-                sampling_frequency = config.get("sampling_frequency", 20000)
-                
-                num_frames = file_size // (2 * n_channels)
-                duration_sec = num_frames / sampling_frequency
-                file_info["num_frames"] = num_frames
-                file_info["duration_sec"] = duration_sec
+        file_size = bin_file_sizes[fname]
+        file_info["size_bytes"] = file_size
+        
+        if config is not None:
+            num_frames = file_size // (2 * n_channels)
+            duration_sec = num_frames / sampling_frequency
+            file_info["num_frames"] = num_frames
+            file_info["duration_sec"] = duration_sec
         
         files_info.append(file_info)
     
+    # Long file lists compress well; gzip (level 1, cheap) when the client accepts it
+    # (a nonzero q-value; "gzip;q=0" refuses it)
+    if request.accept_encodings["gzip"] > 0:
+        payload = json.dumps({"files": files_info}, separators=(",", ":")).encode()
+        return Response(
+            gzip.compress(payload, compresslevel=1),
+            mimetype="application/json",
+            headers={"Content-Encoding": "gzip", "Vary": "Accept-Encoding"}
+        )
+    
     return jsonify({"files": files_info})
 
 
@@ -84,8 +162,7 @@ def get_shift_coefficients_handler():
     if not os.path.exists(shift_coeffs_path):
         return jsonify({"error": "Shift coefficients not found"}), 404
     
-    with open(shift_coeffs_path, "r") as f:
-        shift_coeffs = yaml.safe_load(f)
+    shift_coeffs = load_yaml(shift_coeffs_path)
     
     return jsonify(shift_coeffs)
 
@@ -98,7 +175,10 @@ def get_templates_handler(filename):
     if not os.path.exists(templates_path):
         return jsonify({"error": "Templates file not found"}), 404
     
-    return send_file(templates_path, mimetype="application/octet-stream")
+    redirect = _x_accel_redirect(templates_path, "application/octet-stream")
+    if redirect is not None:
+        return redirect
+    return send_file(templates_path, mimetype="application/octet-stream", conditional=True)
 
 
 def get_binary_data_handler(data_type, filename):
@@ -108,8 +188,7 @@ def get_binary_data_handler(data_type, filename):
     if not os.path.exists(config_path):
         return jsonify({"error": "Configuration file not found"}), 404
     
-    with open(config_path, "r") as f:
-        config = yaml.safe_load(f)
+    config = load_config(config_path)
     
     n_channels = config.get("n_channels", 512)
     sampling_frequency = config.get("sampling_frequency", 20000)
@@ -136,9 +215,13 @@ def get_binary_data_handler(data_type, filename):
     start_sec = request.args.get("start_sec", type=float)
     end_sec = request.args.get("end_sec", type=float)
     
-    # If no time range specified, return entire file
+    # If no time range specified, return entire file (HTTP Range requests
+    # on it are answered with 206 partial content)
     if start_sec is None and end_sec is None:
-        return send_file(data_path, mimetype="application/octet-stream")
+        redirect = _x_accel_redirect(data_path, "application/octet-stream")
+        if redirect is not None:
+            return redirect
+        return send_file(data_path, mimetype="application/octet-stream", conditional=True)
     
     # Validate time range
     if start_sec is None:
@@ -164,21 +247,22 @@ def get_binary_data_handler(data_type, filename):
     byte_offset = start_frame * bytes_per_frame
     num_bytes = num_frames * bytes_per_frame
     
-    # Read the data segment
-    with open(data_path, "rb") as f:
-        f.seek(byte_offset)
-        data_bytes = f.read(num_bytes)
+    # Stream the data segment in blocks rather than reading it into memory
+    reader = _RangeReader(data_path, byte_offset, num_bytes)
     
     # Return as binary response
     return Response(
-        data_bytes,
+        wrap_file(request.environ, reader, buffer_size=1 << 20),
         mimetype="application/octet-stream",
+        direct_passthrough=True,
         headers={
+            "Content-Length": str(num_bytes),
             "X-Start-Sec": str(start_sec),
             "X-End-Sec": str(end_sec),
             "X-Num-Frames": str(num_frames),
             "X-Num-Channels": str(n_channels),
-            "X-Sampling-Frequency": str(sampling_frequency)
+            "X-Sampling-Frequency": str(sampling_frequency),
+            "X-Byte-Offset": str(byte_offset)
         }
     )
 
@@ -191,8 +275,7 @@ def get_high_activity_handler(filename):
     if not os.path.exists(high_activity_path):
         return jsonify({"error": "High activity file not found"}), 404
     
-    with open(high_activity_path, "r") as f:
-        data = json.load(f)
+    data = load_json(high_activity_path)
     
     return jsonify(data)
 
@@ -205,8 +288,7 @@ def get_stats_handler(filename):
     if not os.path.exists(stats_path):
         return jsonify({"error": "Stats file not found"}), 404
     
-    with open(stats_path, "r") as f:
-        data = json.load(f)
+    data = load_json(stats_path)
     
     return jsonify(data)
 
@@ -218,6 +300,12 @@ def get_preview_file_handler(filename, filepath):
     if not os.path.exists(preview_dir):
         return jsonify({"error": "Preview directory not found"}), 404
     
+    if current_app.config.get("X_ACCEL_REDIRECT_PREFIX"):
+        file_path = safe_join(preview_dir, filepath)
+        if file_path is None or not os.path.isfile(file_path):
+            return jsonify({"error": "Preview file not found"}), 404
+        return _x_accel_redirect(file_path, None)
+    
     # Serve the file with range request support
     return send_from_directory(
         preview_dir,
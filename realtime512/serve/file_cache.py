@@ -0,0 +1,43 @@
+"""
+Cached loading of the YAML and JSON files served by the API handlers.
+
+Parsed files are cached keyed by (path, mtime, size), so a file is re-parsed
+only after it changes. Callers must not modify the results.
+"""
+
+import os
+import functools
+import json
+import yaml
+
+# Use the libyaml parser when available
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+@functools.lru_cache(maxsize=256)
+def _parse_yaml_file(path, mtime, size):
+    with open(path, "r") as f:
+        return yaml.load(f, Loader=_YAML_LOADER)
+
+
+@functools.lru_cache(maxsize=256)
+def _parse_json_file(path, mtime, size):
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def load_yaml(path):
+    """Load a YAML file, re-parsing it only when it changes."""
+    st = os.stat(path)
+    return _parse_yaml_file(path, st.st_mtime, st.st_size)
+
+
+def load_json(path):
+    """Load a JSON file, re-parsing it only when it changes."""
+    st = os.stat(path)
+    return _parse_json_file(path, st.st_mtime, st.st_size)
+
+
+def load_config(config_path):
+    """Load the realtime512.yaml config."""
+    return load_yaml(config_path)
@@ -4,9 +4,10 @@ import os
 import json
 import hashlib
 import numpy as np
-import yaml
 from flask import jsonify, request
 
+from .file_cache import load_config
+
 def _get_focus_units_path():
     """Get path to focus_units.json file."""
     return os.path.join(os.getcwd(), "focus_units.json")
@@ -275,12 +276,11 @@ def get_coarse_sorting_units_handler(filename):
     # Load spike labels to get unique unit IDs
     try:
         spike_labels = np.load(spike_labels_path)
-        unique_units = np.unique(spike_labels)
+        # Count spikes per unit in the same pass
+        unique_units, unit_counts = np.unique(spike_labels, return_counts=True)
         
-        # Count spikes per unit
         units_info = []
-        for unit_id in unique_units:
-            num_spikes = np.sum(spike_labels == unit_id)
+        for unit_id, num_spikes in zip(unique_units, unit_counts):
             units_info.append({
                 "unit_id": int(unit_id),
                 "num_spikes": int(num_spikes)
@@ -320,8 +320,7 @@ def get_spike_train_for_focus_unit_handler(focus_unit_id):
     if not os.path.exists(config_path):
         return jsonify({"error": "Configuration file not found"}), 404
     
-    with open(config_path, "r") as f:
-        config = yaml.safe_load(f)
+    config = load_config(config_path)
     
     n_channels = config.get("n_channels", 512)
     sampling_frequency = config.get("sampling_frequency", 20000)
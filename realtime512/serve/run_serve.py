@@ -23,6 +23,64 @@ from .focus_units_handlers import (
     get_spike_train_for_focus_unit_handler,
 )
 
+def create_app():
+    """
+    Create the Flask app serving the experiment in the current directory.
+
+    Can be used directly with a WSGI server, e.g.
+    gunicorn -k gevent "realtime512.serve.run_serve:create_app()"
+    """
+    # Create Flask app
+    app = Flask(__name__)
+
+    # When served behind nginx, whole files can be handed off to nginx with
+    # X-Accel-Redirect (kernel sendfile). The prefix is an internal nginx
+    # location aliased to the experiment directory, e.g.
+    #   location /_realtime512/ { internal; alias /path/to/experiment/; }
+    app.config["X_ACCEL_REDIRECT_PREFIX"] = os.environ.get("REALTIME512_X_ACCEL_REDIRECT_PREFIX")
+
+    # Enable CORS for localhost:5173 and https://realtime512-dashboard.vercel.app and expose custom headers
+    CORS(app, origins=["http://localhost:5173", "https://realtime512-dashboard.vercel.app"], expose_headers=[
+        "X-Start-Sec",
+        "X-End-Sec", 
+        "X-Num-Frames",
+        "X-Num-Channels",
+        "X-Sampling-Frequency",
+        "X-Byte-Offset",
+        "Content-Range",
+        "Accept-Ranges"
+    ])
+    
+    # Register routes
+    # The handlers are registered directly as view functions (their
+    # parameters match the URL variables), so there is no wrapper per request
+    app.add_url_rule("/api/config", "get_config", get_config_handler, methods=["GET"])
+    app.add_url_rule("/api/files", "get_files", get_files_handler, methods=["GET"])
+    app.add_url_rule("/api/shift_coefficients", "get_shift_coefficients", get_shift_coefficients_handler, methods=["GET"])
+    app.add_url_rule("/api/templates/<filename>", "get_templates", get_templates_handler, methods=["GET"])
+    # One rule for /api/raw/, /api/filt/ and /api/shifted/
+    app.add_url_rule(
+        "/api/<any(raw, filt, shifted):data_type>/<filename>", "get_binary_data", get_binary_data_handler, methods=["GET"]
+    )
+    app.add_url_rule("/api/high_activity/<filename>", "get_high_activity", get_high_activity_handler, methods=["GET"])
+    app.add_url_rule("/api/stats/<filename>", "get_stats", get_stats_handler, methods=["GET"])
+    app.add_url_rule("/api/preview/<filename>/<path:filepath>", "get_preview_file", get_preview_file_handler, methods=["GET"])
+    app.add_url_rule("/api/focus_units", "get_focus_units", get_focus_units_handler, methods=["GET"])
+    app.add_url_rule("/api/focus_units", "add_focus_units", add_focus_units_handler, methods=["POST"])
+    app.add_url_rule("/api/focus_units/<focus_unit_id>", "update_focus_unit", update_focus_unit_handler, methods=["PUT"])
+    app.add_url_rule("/api/focus_units/<focus_unit_id>", "delete_focus_unit", delete_focus_unit_handler, methods=["DELETE"])
+    app.add_url_rule(
+        "/api/coarse_sorting_units/<filename>", "get_coarse_sorting_units", get_coarse_sorting_units_handler, methods=["GET"]
+    )
+    app.add_url_rule(
+        "/api/focus_units/<focus_unit_id>/spike_train",
+        "get_spike_train_for_focus_unit",
+        get_spike_train_for_focus_unit_handler,
+        methods=["GET"],
+    )
+    
+    return app
+
 def run_serve(host="0.0.0.0", port=5000):
     """Main entry point for realtime512 serve."""
     # Check if we're in an experiment directory
@@ -62,82 +120,39 @@ def run_serve(host="0.0.0.0", port=5000):
     print("  GET /api/focus_units/<focus_unit_id>/spike_train - Get spike train for focus unit")
     print("")
     
-    # Create Flask app
-    app = Flask(__name__)
-
-    # Enable CORS for localhost:5173 and https://realtime512-dashboard.vercel.app and expose custom headers
-    CORS(app, origins=["http://localhost:5173", "https://realtime512-dashboard.vercel.app"], expose_headers=[
-        "X-Start-Sec",
-        "X-End-Sec", 
-        "X-Num-Frames",
-        "X-Num-Channels",
-        "X-Sampling-Frequency"
-    ])
-    
-    # Register routes
-    @app.route("/api/config", methods=["GET"])
-    def get_config():
-        return get_config_handler()
-    
-    @app.route("/api/files", methods=["GET"])
-    def get_files():
-        return get_files_handler()
-    
-    @app.route("/api/shift_coefficients", methods=["GET"])
-    def get_shift_coefficients():
-        return get_shift_coefficients_handler()
-    
-    @app.route("/api/templates/<filename>", methods=["GET"])
-    def get_templates(filename):
-        return get_templates_handler(filename)
-    
-    @app.route("/api/raw/<filename>", methods=["GET"])
-    def get_raw(filename):
-        return get_binary_data_handler("raw", filename)
-    
-    @app.route("/api/filt/<filename>", methods=["GET"])
-    def get_filt(filename):
-        return get_binary_data_handler("filt", filename)
-    
-    @app.route("/api/shifted/<filename>", methods=["GET"])
-    def get_shifted(filename):
-        return get_binary_data_handler("shifted", filename)
-    
-    @app.route("/api/high_activity/<filename>", methods=["GET"])
-    def get_high_activity(filename):
-        return get_high_activity_handler(filename)
-    
-    @app.route("/api/stats/<filename>", methods=["GET"])
-    def get_stats(filename):
-        return get_stats_handler(filename)
-    
-    @app.route("/api/preview/<filename>/<path:filepath>", methods=["GET"])
-    def get_preview_file(filename, filepath):
-        return get_preview_file_handler(filename, filepath)
-    
-    @app.route("/api/focus_units", methods=["GET"])
-    def get_focus_units():
-        return get_focus_units_handler()
-    
-    @app.route("/api/focus_units", methods=["POST"])
-    def add_focus_units():
-        return add_focus_units_handler()
-    
-    @app.route("/api/focus_units/<focus_unit_id>", methods=["PUT"])
-    def update_focus_unit(focus_unit_id):
-        return update_focus_unit_handler(focus_unit_id)
-    
-    @app.route("/api/focus_units/<focus_unit_id>", methods=["DELETE"])
-    def delete_focus_unit(focus_unit_id):
-        return delete_focus_unit_handler(focus_unit_id)
-    
-    @app.route("/api/coarse_sorting_units/<filename>", methods=["GET"])
-    def get_coarse_sorting_units(filename):
-        return get_coarse_sorting_units_handler(filename)
-    
-    @app.route("/api/focus_units/<focus_unit_id>/spike_train", methods=["GET"])
-    def get_spike_train_for_focus_unit(focus_unit_id):
-        return get_spike_train_for_focus_unit_handler(focus_unit_id)
+    app = create_app()
     
     # Run the server
-    app.run(host=host, port=port, debug=False)
+    # Use gunicorn with a gevent worker when installed, so that a slow binary
+    # download does not hold up other requests; otherwise the threaded
+    # development server
+    if not _run_with_gunicorn(app, host=host, port=port):
+        app.run(host=host, port=port, debug=False, threaded=True)
+
+
+def _run_with_gunicorn(app, *, host, port):
+    """
+    Serve app with gunicorn + gevent. Returns False if they are not installed.
+
+    One worker process by default: the focus unit handlers read-modify-write
+    focus_units.json and the handlers cache parsed files per process, so
+    more processes (REALTIME512_SERVE_WORKERS) are opt-in.
+    """
+    workers = int(os.environ.get("REALTIME512_SERVE_WORKERS", "1"))
+    try:
+        import gevent  # noqa: F401
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        return False
+
+    class _Application(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", f"{host}:{port}")
+            self.cfg.set("worker_class", "gevent")
+            self.cfg.set("workers", workers)
+
+        def load(self):
+            return app
+
+    _Application().run()
+    return True
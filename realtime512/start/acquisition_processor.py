@@ -4,13 +4,40 @@ into fixed-duration raw files.
 
 This module uses a stateless approach - it determines what needs to be done
 based on existing acquisition and raw files, so it can recover from restarts.
+The only thing persisted is a cache of the sizes of acquisition files that
+are no longer being written, so they are not re-stated on every poll.
 """
 
+import bisect
+import json
 import os
+import re
+import sys
 import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 
 
+# Raw chunk file names, e.g. raw_0005.bin
+_RAW_FILE_RE = re.compile(r"^raw_(\d+)\.bin$")
+
+# Acquisition files modified more recently than this are still being written
+_ACQ_FRESHNESS_SEC = 5
+
+# Maximum number of acquisition files kept open while creating raw chunks
+_MAX_OPEN_ACQ_FILES = 32
+
+# On Linux, raw chunks are copied from the acquisition files with sendfile,
+# which copies between files in the kernel; elsewhere they are read into a
+# buffer and written from it
+_USE_SENDFILE = sys.platform.startswith("linux") and hasattr(os, "sendfile")
+
+# Raw chunks are written under this suffix and renamed when complete, so
+# raw/ only ever shows complete chunks
+_PARTIAL_SUFFIX = ".part"
+
+
 class AcquisitionProcessor:
     """
     Processes acquisition files (variable-sized chunks from acquisition system)
@@ -27,7 +54,8 @@ class AcquisitionProcessor:
         computed_dir: str,
         n_channels: int,
         sampling_frequency: float,
-        chunk_duration_sec: float
+        chunk_duration_sec: float,
+        drop_acquisition_cache: bool = False
     ):
         self.acquisition_dir = acquisition_dir
         self.raw_dir = raw_dir
@@ -35,9 +63,13 @@ class AcquisitionProcessor:
         self.n_channels = n_channels
         self.sampling_frequency = sampling_frequency
         self.chunk_duration_sec = chunk_duration_sec
+        # Acquisition data is read exactly once, so optionally tell the kernel
+        # to drop it from the page cache after it has been rechunked
+        self.drop_acquisition_cache = drop_acquisition_cache and hasattr(os, "posix_fadvise")
         self.frames_per_chunk = int(sampling_frequency * chunk_duration_sec)
         self.bytes_per_frame = 2 * n_channels  # int16
         self.bytes_per_chunk = self.frames_per_chunk * self.bytes_per_frame
+        self.watermark_path = os.path.join(computed_dir, "acquisition_scan.json")
     
     def process_acquisition_files(self) -> bool:
         """
@@ -49,50 +81,39 @@ class AcquisitionProcessor:
         
         Returns True if any processing was done, False otherwise.
         """
-        # Get sorted list of acquisition .bin files
-        acq_files = sorted([
-            fname for fname in os.listdir(self.acquisition_dir)
-            if fname.endswith(".bin")
-        ])
+        # Get sorted list of finished acquisition .bin files with their sizes
+        acq_files = self._list_finished_acquisition_files()
         
         if len(acq_files) == 0:
             return False
         
-        # Skip acquisition files still being written (modified in last 5 seconds)
-        acq_files = [
-            fname for fname in acq_files
-            if time.time() - os.path.getmtime(os.path.join(self.acquisition_dir, fname)) > 5
-        ]
+        # Collect the valid acquisition files with their sizes
+        # (the size must be a whole number of frames)
+        acq_sizes = np.fromiter((size for _, size in acq_files), dtype=np.int64, count=len(acq_files))
+        valid = acq_sizes % self.bytes_per_frame == 0
+        if not valid.all():
+            invalid = [f"{acq_files[j][0]} ({acq_files[j][1]} bytes)" for j in np.flatnonzero(~valid)]
+            print(f"Warning: skipping {len(invalid)} acquisition file(s) with invalid size: {', '.join(invalid)}")
+        acq_entries = [acq_files[j] for j in np.flatnonzero(valid)]
         
-        if len(acq_files) == 0:
-            return False
+        # Byte offset of each acquisition file within the concatenated data
+        # (length len(acq_entries) + 1; the last entry is the total)
+        acq_start_bytes = [0] + np.cumsum(acq_sizes[valid]).tolist()
         
         # Calculate total frames available from acquisition files
-        total_acq_bytes = 0
-        for fname in acq_files:
-            filepath = os.path.join(self.acquisition_dir, fname)
-            file_size = os.path.getsize(filepath)
-            
-            # Validate file size
-            if file_size % self.bytes_per_frame != 0:
-                print(f"Warning: {fname} has invalid size ({file_size} bytes), skipping")
-                continue
-            
-            total_acq_bytes += file_size
-        
+        total_acq_bytes = acq_start_bytes[-1]
         total_acq_frames = total_acq_bytes // self.bytes_per_frame
         
         # Count existing raw files and their total frames
-        raw_files = sorted([
-            fname for fname in os.listdir(self.raw_dir)
-            if fname.startswith("raw_") and fname.endswith(".bin")
-        ])
-        
-        total_raw_frames = 0
-        for fname in raw_files:
-            filepath = os.path.join(self.raw_dir, fname)
-            file_size = os.path.getsize(filepath)
-            total_raw_frames += file_size // self.bytes_per_frame
+        raw_indices = []
+        raw_sizes = []
+        for fname, st in _scan_bin_files(self.raw_dir):
+            m = _RAW_FILE_RE.match(fname)
+            if m is None:
+                continue
+            raw_indices.append(int(m.group(1)))
+            raw_sizes.append(st.st_size)
+        total_raw_frames = int((np.array(raw_sizes, dtype=np.int64) // self.bytes_per_frame).sum())
         
         # Determine how many new raw chunks we can create
         # We can create a chunk if we have enough unprocessed frames
@@ -114,112 +135,327 @@ class AcquisitionProcessor:
         # debug print
         print(f"Processing acquisition files to create new raw chunks...")
         
-        # Determine next raw file index
-        if len(raw_files) == 0:
-            next_raw_index = 1
-        else:
-            # Extract index from last raw file (e.g., raw_0005.bin -> 5)
-            last_file = raw_files[-1]
-            try:
-                last_index = int(last_file.replace("raw_", "").replace(".bin", ""))
-                next_raw_index = last_index + 1
-            except ValueError:
-                next_raw_index = len(raw_files) + 1
+        # Determine next raw file index (one past the highest existing index,
+        # e.g. raw_0005.bin -> 6)
+        next_raw_index = max(raw_indices, default=0) + 1
 
         # debug print
         print(f"Next raw file index: {next_raw_index}")
 
         # Create new raw chunks
+        # Acquisition files stay open across consecutive chunks (an acquisition
+        # file usually spans several chunks) and are all closed at the end.
+        # Without sendfile, each chunk is written on a background thread while
+        # the next one is read; at most one write is pending, so chunks are
+        # created in order.
         something_processed = False
-        while frames_remaining >= self.frames_per_chunk:
-            # Read data starting from offset frames_already_chunked
-            data = self._read_frames_from_acquisition(
-                acq_files,
-                start_frame=frames_already_chunked,
-                num_frames=self.frames_per_chunk
-            )
-            
-            if data is None or data.nbytes < self.bytes_per_chunk:
-                break
-            
-            # Write raw chunk
-            filename = f"raw_{next_raw_index:04d}.bin"
-            filepath = os.path.join(self.raw_dir, filename)
-            data[:self.bytes_per_chunk].tofile(filepath)
-            
-            print(f"Created {filename} ({self.chunk_duration_sec}s, {self.frames_per_chunk} frames)")
-            
-            frames_already_chunked += self.frames_per_chunk
-            frames_remaining -= self.frames_per_chunk
-            next_raw_index += 1
-            something_processed = True
+        frames_per_chunk = self.frames_per_chunk
+        bytes_per_chunk = self.bytes_per_chunk
+        raw_dir = self.raw_dir
+        fd_cache = OrderedDict()
+        pending_write = None
+        writer = ThreadPoolExecutor(max_workers=1)
+        try:
+            while frames_remaining >= frames_per_chunk:
+                filename = f"raw_{next_raw_index:04d}.bin"
+                filepath = os.path.join(raw_dir, filename)
+                
+                if _USE_SENDFILE:
+                    # Copy data starting from offset frames_already_chunked
+                    # straight into the raw chunk
+                    if not self._copy_frames_from_acquisition(
+                        acq_entries,
+                        acq_start_bytes,
+                        start_frame=frames_already_chunked,
+                        num_frames=frames_per_chunk,
+                        fd_cache=fd_cache,
+                        output_path=filepath + _PARTIAL_SUFFIX
+                    ):
+                        break
+                    os.replace(filepath + _PARTIAL_SUFFIX, filepath)
+                else:
+                    # Read data starting from offset frames_already_chunked
+                    data = self._read_frames_from_acquisition(
+                        acq_entries,
+                        acq_start_bytes,
+                        start_frame=frames_already_chunked,
+                        num_frames=frames_per_chunk,
+                        fd_cache=fd_cache
+                    )
+                    
+                    if data is None or data.nbytes < bytes_per_chunk:
+                        break
+                    
+                    # Write raw chunk (data is exactly one chunk of int16 samples)
+                    if pending_write is not None:
+                        pending_write.result()
+                    pending_write = writer.submit(_write_chunk, filepath, data)
+                
+                print(f"Created {filename} ({self.chunk_duration_sec}s, {frames_per_chunk} frames)")
+                
+                frames_already_chunked += frames_per_chunk
+                frames_remaining -= frames_per_chunk
+                next_raw_index += 1
+                something_processed = True
+            if pending_write is not None:
+                pending_write.result()
+        finally:
+            writer.shutdown(wait=True)
+            for fd in fd_cache.values():
+                os.close(fd)
         
         return something_processed
     
+    def _list_finished_acquisition_files(self) -> list:
+        """
+        Return (filename, size) for the acquisition .bin files, sorted by name,
+        skipping files still being written (modified in the last 5 seconds).
+        
+        Files before the first one still being written do not change any more,
+        so their sizes are kept in the watermark file and only the files after
+        them are stat'ed. If the watermark does not match the directory (e.g.
+        a file was removed), everything is stat'ed again.
+        """
+        with os.scandir(self.acquisition_dir) as entries:
+            names = sorted(entry.name for entry in entries if entry.name.endswith(".bin"))
+        
+        finished = self._load_watermark()
+        if [fname for fname, _ in finished] != names[:len(finished)]:
+            finished = []
+        num_cached = len(finished)
+        
+        acq_files = list(finished)
+        # The watermark is only extended up to the first file being written
+        extend_watermark = True
+        now = time.time()
+        for fname in names[num_cached:]:
+            try:
+                st = os.stat(os.path.join(self.acquisition_dir, fname))
+            except FileNotFoundError:
+                extend_watermark = False
+                continue
+            if now - st.st_mtime <= _ACQ_FRESHNESS_SEC:
+                extend_watermark = False
+                continue
+            acq_files.append((fname, st.st_size))
+            if extend_watermark:
+                finished.append((fname, st.st_size))
+        
+        if len(finished) > num_cached:
+            self._save_watermark(finished)
+        return acq_files
+    
+    def _load_watermark(self) -> list:
+        """Load the cached (filename, size) list of finished acquisition files, or []."""
+        try:
+            with open(self.watermark_path, "r") as f:
+                watermark = json.load(f)
+            return [(fname, int(size)) for fname, size in watermark["files"]]
+        except (OSError, ValueError, KeyError, TypeError):
+            return []
+    
+    def _save_watermark(self, finished: list):
+        """Atomically write the cached (filename, size) list of finished acquisition files."""
+        tmp_path = self.watermark_path + ".tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump({"files": finished}, f)
+            os.replace(tmp_path, self.watermark_path)
+        except OSError as e:
+            print(f"Warning: could not save {self.watermark_path}: {e}")
+    
     def _read_frames_from_acquisition(
         self,
-        acq_files: list,
+        acq_entries: list,
+        acq_start_bytes: list,
         start_frame: int,
-        num_frames: int
+        num_frames: int,
+        fd_cache: OrderedDict
     ) -> np.ndarray:
         """
         Read num_frames frames starting from start_frame across the acquisition files.
         
+        acq_entries is a list of (filename, file_size) for the valid acquisition
+        files, and acq_start_bytes the byte offset of each of them within the
+        concatenated data (with the total appended). fd_cache maps file paths
+        to open file descriptors, reused across calls (see _get_cached_fd).
+        
         Returns int16 array of data (flat), or None if not enough data available.
         """
-        # Calculate byte offset within the acquisition data
-        start_byte = start_frame * self.bytes_per_frame
         bytes_needed = num_frames * self.bytes_per_frame
+        drop_acquisition_cache = self.drop_acquisition_cache
         
-        # Find which acquisition files we need to read from
-        current_byte = 0
-        data_parts = []
+        # Output buffer of the known final size; each file's portion is read
+        # straight into its place
+        data = np.empty(bytes_needed // 2, dtype=np.int16)
+        data_bytes = memoryview(data).cast("B")
+        bytes_read = 0
         
-        for fname in acq_files:
-            filepath = os.path.join(self.acquisition_dir, fname)
-            file_size = os.path.getsize(filepath)
-            
-            # Skip invalid files
-            if file_size % self.bytes_per_frame != 0:
-                continue
-            
-            # Check if this file contains any of the bytes we need
-            file_start_byte = current_byte
-            file_end_byte = current_byte + file_size
-            
-            if file_end_byte <= start_byte:
-                # This file is entirely before our start offset
-                current_byte = file_end_byte
-                continue
-            
-            if file_start_byte >= start_byte + bytes_needed:
-                # This file is entirely after what we need
+        for filepath, offset_in_file, bytes_from_this_file in self._acquisition_segments(
+            acq_entries, acq_start_bytes, start_frame, num_frames
+        ):
+            # Read only the needed portion of the file
+            fd = _get_cached_fd(fd_cache, filepath)
+            n = _read_into(fd, offset_in_file, data_bytes[bytes_read:bytes_read + bytes_from_this_file])
+            if drop_acquisition_cache and n > 0:
+                os.posix_fadvise(fd, offset_in_file, n, os.POSIX_FADV_DONTNEED)
+            bytes_read += n
+            if n < bytes_from_this_file:
+                # File is shorter than when it was listed
                 break
+        
+        if bytes_read == 0:
+            return None
+        
+        # Partial data if the acquisition files ran out
+        return data[:bytes_read // 2]
+    
+    def _copy_frames_from_acquisition(
+        self,
+        acq_entries: list,
+        acq_start_bytes: list,
+        start_frame: int,
+        num_frames: int,
+        fd_cache: OrderedDict,
+        output_path: str
+    ) -> bool:
+        """
+        Copy num_frames frames starting from start_frame across the acquisition
+        files into a new file at output_path, using sendfile.
+        
+        Arguments are as for _read_frames_from_acquisition. Returns True if the
+        file was written; if not enough data is available, no file is left
+        behind and False is returned.
+        """
+        bytes_needed = num_frames * self.bytes_per_frame
+        drop_acquisition_cache = self.drop_acquisition_cache
+        bytes_copied = 0
+        
+        out_fd = os.open(output_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+        try:
+            for filepath, offset_in_file, bytes_from_this_file in self._acquisition_segments(
+                acq_entries, acq_start_bytes, start_frame, num_frames
+            ):
+                fd = _get_cached_fd(fd_cache, filepath)
+                n = _sendfile_all(out_fd, fd, offset_in_file, bytes_from_this_file)
+                if drop_acquisition_cache and n > 0:
+                    os.posix_fadvise(fd, offset_in_file, n, os.POSIX_FADV_DONTNEED)
+                bytes_copied += n
+                if n < bytes_from_this_file:
+                    # File is shorter than when it was listed
+                    break
+        finally:
+            os.close(out_fd)
+        
+        if bytes_copied < bytes_needed:
+            os.remove(output_path)
+            return False
+        return True
+    
+    def _acquisition_segments(
+        self,
+        acq_entries: list,
+        acq_start_bytes: list,
+        start_frame: int,
+        num_frames: int
+    ):
+        """
+        Yield (filepath, offset_in_file, num_bytes) for the portions of the
+        acquisition files that make up num_frames frames starting from
+        start_frame, in order.
+        """
+        # Calculate byte offset within the acquisition data
+        bytes_per_frame = self.bytes_per_frame
+        start_byte = start_frame * bytes_per_frame
+        bytes_needed = num_frames * bytes_per_frame
+        acquisition_dir = self.acquisition_dir
+        num_entries = len(acq_entries)
+        
+        # Index of the acquisition file containing start_byte
+        i = bisect.bisect_right(acq_start_bytes, start_byte) - 1
+        bytes_done = 0
+        
+        while i < num_entries and bytes_done < bytes_needed:
+            fname, file_size = acq_entries[i]
             
-            # This file contains some portion of the data we need
             # Calculate offset within this file
-            offset_in_file = max(0, start_byte - file_start_byte)
+            offset_in_file = start_byte + bytes_done - acq_start_bytes[i]
             bytes_from_this_file = min(
                 file_size - offset_in_file,
-                bytes_needed - sum(len(p) for p in data_parts) * 2
+                bytes_needed - bytes_done
             )
-            
-            # Read the needed portion
-            file_data = np.fromfile(filepath, dtype=np.int16, count=-1)
-            start_idx = offset_in_file // 2  # Convert bytes to int16 samples
-            end_idx = start_idx + (bytes_from_this_file // 2)
-            data_parts.append(file_data[start_idx:end_idx])
-            
-            current_byte = file_end_byte
-            
-            # Check if we have all the data we need
-            if sum(len(p) for p in data_parts) * 2 >= bytes_needed:
-                break
-        
-        if len(data_parts) == 0:
-            return None
-        
-        # Concatenate all parts
-        data = np.concatenate(data_parts)
-        
-        return data
+            yield os.path.join(acquisition_dir, fname), offset_in_file, bytes_from_this_file
+            bytes_done += bytes_from_this_file
+            i += 1
+
+
+def _scan_bin_files(dir_path: str) -> list:
+    """List (filename, stat_result) for the .bin files in a directory with a single scan."""
+    with os.scandir(dir_path) as entries:
+        return [(entry.name, entry.stat()) for entry in entries if entry.name.endswith(".bin")]
+
+
+def _get_cached_fd(fd_cache: OrderedDict, filepath: str) -> int:
+    """
+    Return a read-only file descriptor for filepath from fd_cache, opening it
+    if needed. At most _MAX_OPEN_ACQ_FILES are kept open; the least recently
+    used one is closed first. The caller closes the remaining descriptors.
+    """
+    fd = fd_cache.get(filepath)
+    if fd is not None:
+        fd_cache.move_to_end(filepath)
+        return fd
+    fd = os.open(filepath, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    fd_cache[filepath] = fd
+    if len(fd_cache) > _MAX_OPEN_ACQ_FILES:
+        _, oldest_fd = fd_cache.popitem(last=False)
+        os.close(oldest_fd)
+    return fd
+
+
+def _read_into(fd: int, offset: int, buf: memoryview) -> int:
+    """
+    Read len(buf) bytes of an open file starting at offset into buf, returning
+    the number of bytes read (fewer only at end of file).
+    """
+    if not hasattr(os, "preadv"):
+        # e.g. Windows, which has neither preadv nor readv
+        os.lseek(fd, offset, os.SEEK_SET)
+    total = 0
+    while total < len(buf):
+        # Positional read (one syscall, no seek) where supported
+        if hasattr(os, "preadv"):
+            n = os.preadv(fd, [buf[total:]], offset + total)
+        else:
+            chunk = os.read(fd, len(buf) - total)
+            n = len(chunk)
+            buf[total:total + n] = chunk
+        if n == 0:
+            break
+        total += n
+    return total
+
+
+def _sendfile_all(out_fd: int, in_fd: int, offset: int, count: int) -> int:
+    """
+    Copy count bytes of in_fd starting at offset to the current position of
+    out_fd, returning the number of bytes copied (fewer only at end of file).
+    """
+    total = 0
+    while total < count:
+        n = os.sendfile(out_fd, in_fd, offset + total, count - total)
+        if n == 0:
+            break
+        total += n
+    return total
+
+
+def _write_chunk(filepath: str, data: np.ndarray):
+    """
+    Write an array's bytes to a new file with a single unbuffered write. The
+    file only appears under its name once it is complete.
+    """
+    tmp_filepath = filepath + _PARTIAL_SUFFIX
+    with open(tmp_filepath, "wb", buffering=0) as f:
+        f.write(memoryview(data).cast("B"))
+    os.replace(tmp_filepath, filepath)
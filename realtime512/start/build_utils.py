@@ -11,6 +11,19 @@ class BuildError(Exception):
     pass
 
 
+def _start_version_check(command: str):
+    """Start `<command> --version` in the background; None if the command is not found."""
+    try:
+        return subprocess.Popen(
+            [command, "--version"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True
+        )
+    except FileNotFoundError:
+        return None
+
+
 def verify_node_and_npm():
     """
     Verify that Node.js >= 18 and npm are installed.
@@ -18,62 +31,52 @@ def verify_node_and_npm():
     Raises:
         BuildError: If Node.js or npm are not found, or if Node.js version < 18
     """
+    # Run both version checks concurrently (npm in particular is slow to start)
+    node_proc = _start_version_check("node")
+    npm_proc = _start_version_check("npm")
+    
     # Check Node.js
-    try:
-        result = subprocess.run(
-            ["node", "--version"],
-            capture_output=True,
-            text=True,
-            check=False
+    if node_proc is None:
+        raise BuildError(
+            "Node.js is required but not found.\n"
+            "Please install Node.js >= 18 from https://nodejs.org"
         )
-        if result.returncode != 0:
-            raise BuildError(
-                "Node.js is required but not found.\n"
-                "Please install Node.js >= 18 from https://nodejs.org"
-            )
-        
-        # Parse version (format: v18.x.x or v20.x.x)
-        version_str = result.stdout.strip()
-        if not version_str.startswith('v'):
-            raise BuildError(f"Could not parse Node.js version: {version_str}")
-        
-        major_version = int(version_str[1:].split('.')[0])
-        if major_version < 18:
-            raise BuildError(
-                f"Node.js version {version_str} found, but version >= 18 is required.\n"
-                f"Please upgrade Node.js from https://nodejs.org"
-            )
-        
-        print(f"✓ Node.js {version_str} found")
-        
-    except FileNotFoundError:
+    node_stdout, _ = node_proc.communicate()
+    if node_proc.returncode != 0:
         raise BuildError(
             "Node.js is required but not found.\n"
             "Please install Node.js >= 18 from https://nodejs.org"
         )
     
+    # Parse version (format: v18.x.x or v20.x.x)
+    version_str = node_stdout.strip()
+    if not version_str.startswith('v'):
+        raise BuildError(f"Could not parse Node.js version: {version_str}")
+    
+    major_version = int(version_str[1:].split('.')[0])
+    if major_version < 18:
+        raise BuildError(
+            f"Node.js version {version_str} found, but version >= 18 is required.\n"
+            f"Please upgrade Node.js from https://nodejs.org"
+        )
+    
+    print(f"✓ Node.js {version_str} found")
+    
     # Check npm
-    try:
-        result = subprocess.run(
-            ["npm", "--version"],
-            capture_output=True,
-            text=True,
-            check=False
+    if npm_proc is None:
+        raise BuildError(
+            "npm is required but not found.\n"
+            "Please install npm (usually included with Node.js)"
         )
-        if result.returncode != 0:
-            raise BuildError(
-                "npm is required but not found.\n"
-                "Please install npm (usually included with Node.js)"
-            )
-        
-        npm_version = result.stdout.strip()
-        print(f"✓ npm v{npm_version} found")
-        
-    except FileNotFoundError:
+    npm_stdout, _ = npm_proc.communicate()
+    if npm_proc.returncode != 0:
         raise BuildError(
             "npm is required but not found.\n"
             "Please install npm (usually included with Node.js)"
         )
+    
+    npm_version = npm_stdout.strip()
+    print(f"✓ npm v{npm_version} found")
 
 
 def run_npm_install(ui_dir: Path):
@@ -0,0 +1,60 @@
+"""
+Wait for changes in the experiment directory between processing passes.
+
+Uses filesystem events from watchdog when it is installed, so an idle
+pipeline does not re-scan the directories every few seconds; otherwise
+falls back to sleeping for the poll interval.
+"""
+
+import threading
+import time
+
+
+class ChangeWatcher:
+    """
+    Watches a set of directories (non-recursively) and lets the main loop
+    block until something in them changes.
+    """
+
+    def __init__(self, dirs: list, poll_interval_sec: float = 5, idle_timeout_sec: float = 60):
+        self.poll_interval_sec = poll_interval_sec
+        self.idle_timeout_sec = idle_timeout_sec
+        self._changed = threading.Event()
+        self._last_change = time.monotonic()
+        self._observer = None
+
+        try:
+            from watchdog.events import FileSystemEventHandler
+            from watchdog.observers import Observer
+        except ImportError:
+            return
+
+        watcher = self
+
+        class _Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                watcher._last_change = time.monotonic()
+                watcher._changed.set()
+
+        observer = Observer()
+        handler = _Handler()
+        for d in dirs:
+            observer.schedule(handler, d, recursive=False)
+        observer.daemon = True
+        observer.start()
+        self._observer = observer
+
+    def wait(self):
+        """
+        Wait before the next processing pass.
+
+        Files are only processed once they have not been modified for a few
+        seconds, so while there have been recent changes this sleeps for the
+        poll interval as before. Otherwise it blocks until the next change
+        (or idle_timeout_sec, as a safeguard against missed events).
+        """
+        if self._observer is None or time.monotonic() - self._last_change < 2 * self.poll_interval_sec:
+            time.sleep(self.poll_interval_sec)
+        else:
+            self._changed.wait(self.idle_timeout_sec)
+        self._changed.clear()
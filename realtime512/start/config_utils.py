@@ -43,8 +43,10 @@ def create_config_file():
     else:
         default_config['use_acquisition_folder'] = False
 
+    # Use the libyaml emitter when available
+    dumper = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
     with open("realtime512.yaml", "w") as f:
-        yaml.dump(default_config, f)
+        yaml.dump(default_config, f, Dumper=dumper)
 
 
 def check_or_create_config():
@@ -70,8 +72,10 @@ def check_or_create_config():
 
 def load_and_validate_config(config_path):
     """Load configuration file and validate required fields."""
+    # Use the libyaml parser when available
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
     with open(config_path, "r") as f:
-        config = yaml.safe_load(f)
+        config = yaml.load(f, Loader=loader)
     print("Configuration:")
     print(config)
 
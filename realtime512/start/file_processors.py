@@ -1,5 +1,8 @@
 import os
 import json
+import shutil
+import hashlib
+import functools
 import numpy as np
 import yaml
 
@@ -12,42 +15,204 @@ from ..helpers.generate_preview import generate_preview
 from ..helpers.coarse_sorting import compute_coarse_sorting
 from ..helpers.unit_matching import compute_unit_matches, calculate_spike_labels_hash
 
+# Use the libyaml parser and emitter when available
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+_YAML_DUMPER = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
+# The computed/ subdirectories are created up front by setup_directories.
+# Each stage checks which outputs already exist with one listing of the
+# relevant directories per call, rather than os.path.exists per file
+
+def _list_names(dir_path):
+    """Set of entry names in a directory (empty if it does not exist)."""
+    try:
+        return set(os.listdir(dir_path))
+    except FileNotFoundError:
+        return set()
+
+def _scan_sizes(dir_path):
+    """Map of file name to size for a directory (empty if it does not exist)."""
+    try:
+        with os.scandir(dir_path) as entries:
+            return {entry.name: entry.stat().st_size for entry in entries}
+    except FileNotFoundError:
+        return {}
+
+def _spike_labels_hash(spike_labels_path):
+    """
+    Hash of a spike_labels.npy file, or None if it does not exist. The hash
+    is only recomputed when the file's modification time or size changes.
+    """
+    try:
+        st = os.stat(spike_labels_path)
+    except FileNotFoundError:
+        return None
+    return _spike_labels_hash_cached(spike_labels_path, st.st_mtime_ns, st.st_size)
+
+@functools.lru_cache(maxsize=1024)
+def _spike_labels_hash_cached(spike_labels_path, mtime_ns, size):
+    return calculate_spike_labels_hash(spike_labels_path)
+
+def _load_high_activity_intervals(high_activity_path):
+    """
+    High activity intervals from a .high_activity.json file, as a read-only
+    (num_intervals, 2) array of (start_sec, end_sec). The file is only parsed
+    again when its modification time or size changes.
+    """
+    st = os.stat(high_activity_path)
+    return _load_high_activity_intervals_cached(high_activity_path, st.st_mtime_ns, st.st_size)
+
+@functools.lru_cache(maxsize=256)
+def _load_high_activity_intervals_cached(high_activity_path, mtime_ns, size):
+    with open(high_activity_path, "r") as f:
+        high_activity_data = json.load(f)
+    intervals = np.array(
+        [(item['start_sec'], item['end_sec']) for item in high_activity_data['high_activity_intervals']],
+        dtype=np.float64
+    ).reshape(-1, 2)
+    intervals.flags.writeable = False  # shared between callers
+    return intervals
+
+
+# Each output records a key of the parameters and inputs it was computed
+# from, so outputs are recomputed when a relevant config value changes (and
+# everything downstream of them, since their keys change too)
+
+def _stage_key(params, *input_keys):
+    """
+    Key for an output: hash of the stage parameters and the keys of its
+    inputs. None if an input has no key (not computed yet or incomplete).
+    """
+    if any(k is None for k in input_keys):
+        return None
+    h = hashlib.blake2b(json.dumps(params, sort_keys=True).encode(), digest_size=16)
+    for k in input_keys:
+        h.update(k.encode())
+    return h.hexdigest()
+
+class _StageKeys:
+    """
+    Keys of the outputs in one computed/ subdirectory, stored in its
+    .stage_keys.json. An output is reused only when its stored key matches
+    the current one; an output whose write was interrupted has no key.
+    """
+    def __init__(self, stage_dir):
+        self.path = os.path.join(stage_dir, ".stage_keys.json")
+        try:
+            with open(self.path, "r") as f:
+                self.keys = json.load(f)
+            self.is_new = False
+        except (OSError, ValueError):
+            self.keys = {}
+            self.is_new = True
+
+    def adopt(self, expected_keys, existing_names):
+        """
+        If there is no key file yet (outputs from before keys were recorded),
+        take the existing outputs as computed with the current keys. Nothing
+        is adopted (and no key file is written) while none of the current
+        keys is known yet, e.g. before the upstream stage has adopted its own.
+        """
+        if not self.is_new:
+            return
+        if all(key is None for key in expected_keys.values()):
+            return
+        for name, key in expected_keys.items():
+            if key is not None and name in existing_names:
+                self.keys[name] = key
+        self.is_new = False
+        self.save()
+
+    def get(self, name):
+        return self.keys.get(name)
+
+    def is_current(self, name, key):
+        return key is not None and self.keys.get(name) == key
+
+    def set(self, name, key):
+        self.keys[name] = key
+        self.save()
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.keys, f)
+        os.replace(tmp_path, self.path)
+
+def _filt_expected_keys(bin_files, raw_sizes, n_channels, filter_params, sampling_frequency):
+    params = {"filter_params": filter_params, "sampling_frequency": sampling_frequency, "n_channels": n_channels}
+    # A raw file that is no longer listed has no key (it is skipped)
+    return {
+        fname + ".filt": _stage_key(params, str(raw_sizes[fname])) if fname in raw_sizes else None
+        for fname in bin_files
+    }
+
+def check_filtered_files(bin_files, raw_dir, computed_dir, n_channels, filter_params, sampling_frequency):
+    """
+    Prepare filtering on the main thread, before process_filtering is run in
+    the background: record the keys of existing filtered files, so the
+    downstream stages can adopt theirs, and ask whether to reprocess
+    filtered files whose size does not match the raw file (those are removed).
+    """
+    filt_dir = os.path.join(computed_dir, "filt")
+    filt_sizes = _scan_sizes(filt_dir)
+    raw_sizes = _scan_sizes(raw_dir)
+    filt_keys = _StageKeys(filt_dir)
+    expected_keys = _filt_expected_keys(bin_files, raw_sizes, n_channels, filter_params, sampling_frequency)
+    filt_keys.adopt(expected_keys, filt_sizes)
+    for fname in bin_files:
+        filt_path = os.path.join(filt_dir, fname + ".filt")
+        if fname + ".filt" not in filt_sizes:
+            continue
+        if not filt_keys.is_current(fname + ".filt", expected_keys[fname + ".filt"]):
+            continue  # Out of date, reprocessed anyway
+        # Check that it has the expected size (same size as raw file)
+        if filt_sizes[fname + ".filt"] != raw_sizes.get(fname):
+            proceed = input(
+                f"Filtered file {filt_path} exists but size mismatch. Reprocess? (y/n): "
+            )
+            if proceed.lower() == 'y':
+                # remove the existing file to reprocess
+                os.remove(filt_path)
+
 def process_filtering(bin_files, raw_dir, computed_dir, n_channels, filter_params, sampling_frequency):
-    """Apply bandpass filtering to raw .bin files."""
+    """
+    Apply bandpass filtering to raw .bin files. Runs in the background, after
+    check_filtered_files.
+    """
+    filt_dir = os.path.join(computed_dir, "filt")
+    filt_sizes = _scan_sizes(filt_dir)
+    raw_sizes = _scan_sizes(raw_dir)
+    filt_keys = _StageKeys(filt_dir)
+    expected_keys = _filt_expected_keys(bin_files, raw_sizes, n_channels, filter_params, sampling_frequency)
+    filt_keys.adopt(expected_keys, filt_sizes)
     for fname in bin_files:
-        if not os.path.exists(os.path.join(computed_dir, "filt")):
-            os.makedirs(os.path.join(computed_dir, "filt"))
-        filt_path = os.path.join(computed_dir, "filt", fname + ".filt")
-        if os.path.exists(filt_path):
-            # Check that it has the expected size (same size as raw file)
-            raw_path = os.path.join(raw_dir, fname)
-            raw_size = os.path.getsize(raw_path)
-            filt_size = os.path.getsize(filt_path)
-            if filt_size == raw_size:
-                continue  # Already processed
+        filt_path = os.path.join(filt_dir, fname + ".filt")
+        key = expected_keys[fname + ".filt"]
+        if key is None:
+            continue  # Raw file no longer exists
+        if fname + ".filt" in filt_sizes:
+            if not filt_keys.is_current(fname + ".filt", key):
+                print(f"Filtered file {filt_path} is out of date, reprocessing.")
             else:
-                proceed = input(
-                    f"Filtered file {filt_path} exists but size mismatch. Reprocess? (y/n): "
-                )
-                if proceed.lower() != 'y':
-                    continue  # Skip reprocessing
-                else:
-                    # remove the existing file to reprocess
-                    os.remove(filt_path)
-        if not os.path.exists(filt_path):
-            raw_path = os.path.join(raw_dir, fname)
-            filt_path = os.path.join(computed_dir, "filt", fname + ".filt")
-            print(f"Filtering {fname}...")
-            apply_bandpass_filter(
-                input_path=raw_path,
-                output_path=filt_path,
-                num_channels=n_channels,
-                lowcust=filter_params['lowcut'],
-                highcut=filter_params['highcut'],
-                fs=sampling_frequency,
-                order=filter_params['order']
-            )
-            return True
+                # A size mismatch the user chose to keep (see check_filtered_files)
+                continue  # Already processed
+        raw_path = os.path.join(raw_dir, fname)
+        print(f"Filtering {fname}...")
+        # Written under a temporary name and renamed when complete, since the
+        # stages reading filt/ run concurrently with filtering
+        apply_bandpass_filter(
+            input_path=raw_path,
+            output_path=filt_path + ".tmp",
+            num_channels=n_channels,
+            lowcust=filter_params['lowcut'],
+            highcut=filter_params['highcut'],
+            fs=sampling_frequency,
+            order=filter_params['order']
+        )
+        os.replace(filt_path + ".tmp", filt_path)
+        filt_keys.set(fname + ".filt", key)
+        return True
     return False
 
 def estimate_shift_coefficients(bin_files, computed_dir, electrode_coords, sampling_frequency):
@@ -75,41 +240,61 @@ def estimate_shift_coefficients(bin_files, computed_dir, electrode_coords, sampl
         'c_y': c_y
     }
     with open(shift_coeffs_path, "w") as f:
-        yaml.dump(shift_data, f)
+        yaml.dump(shift_data, f, Dumper=_YAML_DUMPER)
     print(f'Using shift coefficients: c_x={c_x:.6e}, c_y={c_y:.6e}')
 
 def load_shift_coefficients(computed_dir):
-    """Load shift coefficients from file if they exist."""
+    """
+    Load shift coefficients from file if they exist. The file is only
+    parsed again when it changes (this is called on every loop iteration).
+    """
     shift_coeffs_path = os.path.join(computed_dir, "shift_coeffs.yaml")
-    if os.path.exists(shift_coeffs_path):
-        with open(shift_coeffs_path, "r") as f:
-            shift_coeffs = yaml.safe_load(f)
-        return shift_coeffs['c_x'], shift_coeffs['c_y']
-    return None, None
+    try:
+        st = os.stat(shift_coeffs_path)
+    except FileNotFoundError:
+        return None, None
+    return _parse_shift_coefficients(shift_coeffs_path, st.st_mtime_ns, st.st_size)
+
+@functools.lru_cache(maxsize=4)
+def _parse_shift_coefficients(shift_coeffs_path, mtime_ns, size):
+    with open(shift_coeffs_path, "r") as f:
+        shift_coeffs = yaml.load(f, Loader=_YAML_LOADER)
+    return shift_coeffs['c_x'], shift_coeffs['c_y']
 
 def process_high_activity_intervals(bin_files, computed_dir, n_channels, sampling_frequency, high_activity_threshold):
     """Compute high activity intervals for filtered files."""
+    high_activity_dir = os.path.join(computed_dir, "high_activity")
+    high_activity_names = _list_names(high_activity_dir)
+    filt_sizes = _scan_sizes(os.path.join(computed_dir, "filt"))
+    filt_keys = _StageKeys(os.path.join(computed_dir, "filt"))
+    high_activity_keys = _StageKeys(high_activity_dir)
+    params = {"high_activity_threshold": high_activity_threshold, "sampling_frequency": sampling_frequency}
+    expected_keys = {
+        fname + ".high_activity.json": _stage_key(params, filt_keys.get(fname + ".filt")) for fname in bin_files
+    }
+    high_activity_keys.adopt(expected_keys, high_activity_names)
     for fname in bin_files:
         filt_path = os.path.join(computed_dir, "filt", fname + ".filt")
-        if not os.path.exists(os.path.join(computed_dir, "high_activity")):
-            os.makedirs(os.path.join(computed_dir, "high_activity"))
-        high_activity_path = os.path.join(computed_dir, "high_activity", fname + ".high_activity.json")
-        if os.path.exists(high_activity_path):
-            continue  # Already processed
-        if not os.path.exists(filt_path):
+        high_activity_path = os.path.join(high_activity_dir, fname + ".high_activity.json")
+        key = expected_keys[fname + ".high_activity.json"]
+        if key is None:
             continue  # Filtered file does not exist yet
+        if high_activity_keys.is_current(fname + ".high_activity.json", key):
+            continue  # Already processed
         print(f"Computing high activity intervals: {fname}.high_activity.json")
+        num_frames = filt_sizes[fname + ".filt"] // (2 * n_channels)
         high_activity_intervals = detect_high_activity_intervals(
             data_path=filt_path,
             num_channels=n_channels,
-            num_frames=os.path.getsize(filt_path) // (2 * n_channels),
+            num_frames=num_frames,
             sampling_frequency_hz=sampling_frequency,
             high_activity_threshold=high_activity_threshold
         )
         num_intervals = len(high_activity_intervals)
         print(f"  Found {num_intervals} high activity intervals.")
-        total_high_activity_duration_sec = sum(end - start for start, end in high_activity_intervals)
-        total_duration_sec = os.path.getsize(filt_path) / (2 * n_channels * sampling_frequency)
+        intervals = np.asarray(high_activity_intervals, dtype=np.float64).reshape(-1, 2)
+        total_high_activity_duration_sec = float((intervals[:, 1] - intervals[:, 0]).sum())
+        total_duration_sec = filt_sizes[fname + ".filt"] / (2 * n_channels * sampling_frequency)
         print(f"  Total high activity duration: {total_high_activity_duration_sec:.2f} sec out of {total_duration_sec:.2f} sec.")
         # write to json file
         with open(high_activity_path, "w") as f:
@@ -118,22 +303,29 @@ def process_high_activity_intervals(bin_files, computed_dir, n_channels, samplin
                     {"start_sec": start, "end_sec": end} for start, end in high_activity_intervals
                 ]
             }, f)
+        high_activity_keys.set(fname + ".high_activity.json", key)
         return True
     return False
 
 def process_spike_stats(bin_files, computed_dir, n_channels, sampling_frequency, detect_threshold_for_spike_stats):
     """Compute spike statistics for filtered files."""
+    stats_dir = os.path.join(computed_dir, "stats")
+    stats_names = _list_names(stats_dir)
+    filt_keys = _StageKeys(os.path.join(computed_dir, "filt"))
+    stats_keys = _StageKeys(stats_dir)
+    params = {"detect_threshold_for_spike_stats": detect_threshold_for_spike_stats, "sampling_frequency": sampling_frequency}
+    expected_keys = {fname + ".stats.json": _stage_key(params, filt_keys.get(fname + ".filt")) for fname in bin_files}
+    stats_keys.adopt(expected_keys, stats_names)
     for fname in bin_files:
         filt_path = os.path.join(computed_dir, "filt", fname + ".filt")
-        if not os.path.exists(os.path.join(computed_dir, "stats")):
-            os.makedirs(os.path.join(computed_dir, "stats"))
-        stats_path = os.path.join(computed_dir, "stats", fname + ".stats.json")
-        if os.path.exists(stats_path):
-            continue  # Already processed
-        if not os.path.exists(filt_path):
+        stats_path = os.path.join(stats_dir, fname + ".stats.json")
+        key = expected_keys[fname + ".stats.json"]
+        if key is None:
             continue  # Filtered file does not exist yet
+        if stats_keys.is_current(fname + ".stats.json", key):
+            continue  # Already processed
         print(f"Computing channel spike stats: {fname}.stats.json")
-        filt_data = np.fromfile(filt_path, dtype=np.int16).reshape(-1, n_channels)
+        filt_data = np.memmap(filt_path, dtype=np.int16, mode='r').reshape(-1, n_channels)
         mean_firing_rates, mean_spike_amplitudes = compute_channel_spike_stats(
             data=filt_data,
             sampling_frequency_hz=sampling_frequency,
@@ -145,6 +337,7 @@ def process_spike_stats(bin_files, computed_dir, n_channels, sampling_frequency,
                 "mean_firing_rates": mean_firing_rates.tolist(),
                 "mean_spike_amplitudes": mean_spike_amplitudes.tolist()
             }, f)
+        stats_keys.set(fname + ".stats.json", key)
         return True
     return False
 
@@ -152,53 +345,99 @@ def process_time_shifts(bin_files, computed_dir, n_channels, sampling_frequency,
     """Apply time shifts to filtered files."""
     if c_x is None or c_y is None:
         return
+    shifted_dir = os.path.join(computed_dir, "shifted")
+    shifted_sizes = _scan_sizes(shifted_dir)
+    filt_sizes = _scan_sizes(os.path.join(computed_dir, "filt"))
+    filt_keys = _StageKeys(os.path.join(computed_dir, "filt"))
+    shifted_keys = _StageKeys(shifted_dir)
+    params = {"c_x": c_x, "c_y": c_y, "sampling_frequency": sampling_frequency}
+    expected_keys = {fname + ".shifted": _stage_key(params, filt_keys.get(fname + ".filt")) for fname in bin_files}
+    shifted_keys.adopt(expected_keys, shifted_sizes)
     for fname in bin_files:
         filt_path = os.path.join(computed_dir, "filt", fname + ".filt")
-        if not os.path.exists(os.path.join(computed_dir, "shifted")):
-            os.makedirs(os.path.join(computed_dir, "shifted"))
-        shifted_path = os.path.join(computed_dir, "shifted", fname + ".shifted")
-        if os.path.exists(shifted_path):
-            # Check that it has the expected size (same size as filt file)
-            filt_size = os.path.getsize(filt_path)
-            shifted_size = os.path.getsize(shifted_path)
-            if shifted_size == filt_size:
-                continue  # Already processed
+        shifted_path = os.path.join(shifted_dir, fname + ".shifted")
+        key = expected_keys[fname + ".shifted"]
+        if key is None or fname + ".filt" not in filt_sizes:
+            continue  # Filtered file does not exist yet
+        if fname + ".shifted" in shifted_sizes:
+            if not shifted_keys.is_current(fname + ".shifted", key):
+                print(f"Shifted file {shifted_path} is out of date, reprocessing.")
             else:
-                proceed = input(
-                    f"Shifted file {shifted_path} exists but size mismatch. Reprocess? (y/n): "
-                )
-                if proceed.lower() != 'y':
-                    continue  # Skip reprocessing
+                # Check that it has the expected size (same size as filt file)
+                filt_size = filt_sizes[fname + ".filt"]
+                shifted_size = shifted_sizes[fname + ".shifted"]
+                if shifted_size == filt_size:
+                    continue  # Already processed
                 else:
-                    # remove the existing file to reprocess
-                    os.remove(shifted_path)
-        if not os.path.exists(shifted_path):
-            print(f"Applying time shifts cx={c_x:.6e}, cy={c_y:.6e} to {fname}.filt...")
-            filt_data = np.fromfile(filt_path, dtype=np.int16).reshape(-1, n_channels)
-            shift_data = apply_time_shifts(
-                data=filt_data,
-                sampling_frequency_hz=sampling_frequency,
-                c_x=c_x,
-                c_y=c_y,
-                electrode_coords=electrode_coords,
-            )
-            shift_data.astype(np.int16).tofile(shifted_path)
-            print(f"Wrote shifted data to {shifted_path}.")
-            return True
+                    proceed = input(
+                        f"Shifted file {shifted_path} exists but size mismatch. Reprocess? (y/n): "
+                    )
+                    if proceed.lower() != 'y':
+                        continue  # Skip reprocessing
+                    else:
+                        # remove the existing file to reprocess
+                        os.remove(shifted_path)
+        print(f"Applying time shifts cx={c_x:.6e}, cy={c_y:.6e} to {fname}.filt...")
+        filt_data = np.memmap(filt_path, dtype=np.int16, mode='r').reshape(-1, n_channels)
+        # Write into a memory-mapped temporary file that is renamed when
+        # complete, so a partial file never passes the size check above
+        tmp_path = shifted_path + ".tmp"
+        shift_data = np.memmap(tmp_path, dtype=np.int16, mode='w+', shape=filt_data.shape)
+        apply_time_shifts(
+            data=filt_data,
+            sampling_frequency_hz=sampling_frequency,
+            c_x=c_x,
+            c_y=c_y,
+            electrode_coords=electrode_coords,
+            out=shift_data,
+        )
+        shift_data.flush()
+        del shift_data
+        os.replace(tmp_path, shifted_path)
+        shifted_keys.set(fname + ".shifted", key)
+        print(f"Wrote shifted data to {shifted_path}.")
+        return True
     return False
 
 def process_coarse_sorting(bin_files, computed_dir, n_channels, sampling_frequency, electrode_coords, coarse_sorting_detect_threshold):
     """Perform coarse spike sorting on shifted data."""
+    coarse_sorting_root = os.path.join(computed_dir, "coarse_sorting")
+    coarse_sorting_names = _list_names(coarse_sorting_root)
+    shifted_keys = _StageKeys(os.path.join(computed_dir, "shifted"))
+    high_activity_keys = _StageKeys(os.path.join(computed_dir, "high_activity"))
+    coarse_sorting_keys = _StageKeys(coarse_sorting_root)
+    # The keyword arguments passed to compute_coarse_sorting, which are also
+    # part of the key, so the two cannot diverge
+    sorting_kwargs = {
+        "detect_threshold": coarse_sorting_detect_threshold,
+        "num_nearest_neighbors": 20,
+        "num_clusters": 100
+    }
+    params = {
+        "coarse_sorting_detect_threshold": sorting_kwargs["detect_threshold"],
+        "sampling_frequency": sampling_frequency,
+        "num_nearest_neighbors": sorting_kwargs["num_nearest_neighbors"],
+        "num_clusters": sorting_kwargs["num_clusters"]
+    }
+    expected_keys = {
+        fname: _stage_key(params, shifted_keys.get(fname + ".shifted"), high_activity_keys.get(fname + ".high_activity.json"))
+        for fname in bin_files
+    }
+    output_names = {"templates.npy", "spike_times.npy", "spike_labels.npy", "spike_amplitudes.npy"}
+    if coarse_sorting_keys.is_new:
+        complete_names = {
+            fname for fname in coarse_sorting_names
+            if output_names <= _list_names(os.path.join(coarse_sorting_root, fname))
+        }
+        coarse_sorting_keys.adopt(expected_keys, complete_names)
     for fname in bin_files:
         shift_path = os.path.join(computed_dir, "shifted", fname + ".shifted")
         high_activity_path = os.path.join(computed_dir, "high_activity", fname + ".high_activity.json")
-        if not os.path.exists(os.path.join(computed_dir, "coarse_sorting")):
-            os.makedirs(os.path.join(computed_dir, "coarse_sorting"))
         
         # Create subdirectory for this file
-        coarse_sorting_dir = os.path.join(computed_dir, "coarse_sorting", fname)
-        if not os.path.exists(coarse_sorting_dir):
-            os.makedirs(coarse_sorting_dir)
+        coarse_sorting_dir = os.path.join(coarse_sorting_root, fname)
+        if fname not in coarse_sorting_names:
+            os.makedirs(coarse_sorting_dir, exist_ok=True)
         
         # Check if all output files exist
         templates_path = os.path.join(coarse_sorting_dir, "templates.npy")
@@ -206,23 +445,16 @@ def process_coarse_sorting(bin_files, computed_dir, n_channels, sampling_frequen
         spike_labels_path = os.path.join(coarse_sorting_dir, "spike_labels.npy")
         spike_amplitudes_path = os.path.join(coarse_sorting_dir, "spike_amplitudes.npy")
         
-        if (os.path.exists(templates_path) and os.path.exists(spike_times_path) and 
-            os.path.exists(spike_labels_path) and os.path.exists(spike_amplitudes_path)):
+        key = expected_keys[fname]
+        if key is None:
+            continue  # Shifted file or high activity intervals do not exist yet
+        if coarse_sorting_keys.is_current(fname, key):
             continue  # Already processed
         
-        if not os.path.exists(shift_path):
-            continue  # Shifted file does not exist yet
-        if not os.path.exists(high_activity_path):
-            continue  # High activity intervals do not exist yet
-        
         print(f"Computing coarse sorting: {fname}")
-        shift_data = np.fromfile(shift_path, dtype=np.int16).reshape(-1, n_channels)
+        shift_data = np.memmap(shift_path, dtype=np.int16, mode='r').reshape(-1, n_channels)
         
-        with open(high_activity_path, "r") as f:
-            high_activity_data = json.load(f)
-        high_activity_intervals = [
-            (item['start_sec'], item['end_sec']) for item in high_activity_data['high_activity_intervals']
-        ]
+        high_activity_intervals = _load_high_activity_intervals(high_activity_path)
         
         # Perform coarse sorting
         templates, spike_times, spike_labels, spike_amplitudes = compute_coarse_sorting(
@@ -230,9 +462,7 @@ def process_coarse_sorting(bin_files, computed_dir, n_channels, sampling_frequen
             high_activity_intervals=high_activity_intervals,
             sampling_frequency_hz=sampling_frequency,
             electrode_coords=electrode_coords,
-            detect_threshold=coarse_sorting_detect_threshold,
-            num_nearest_neighbors=20,
-            num_clusters=100
+            **sorting_kwargs
         )
         
         # Save outputs
@@ -240,6 +470,7 @@ def process_coarse_sorting(bin_files, computed_dir, n_channels, sampling_frequen
         np.save(spike_times_path, spike_times)
         np.save(spike_labels_path, spike_labels)
         np.save(spike_amplitudes_path, spike_amplitudes)
+        coarse_sorting_keys.set(fname, key)
         
         print(f"  Saved {len(spike_times)} spikes with {len(templates)} templates")
         return True
@@ -279,12 +510,9 @@ def process_unit_matching(bin_files, computed_dir, n_channels, sampling_frequenc
         spike_times_path_x = os.path.join(coarse_sorting_dir_x, "spike_times.npy")
         shifted_path_x = os.path.join(computed_dir, "shifted", fname_x + ".shifted")
         
-        # Skip if X doesn't have coarse sorting
-        if not os.path.exists(spike_labels_path_x):
-            continue
-        
         # Calculate current hash for X
-        current_hash_x = calculate_spike_labels_hash(spike_labels_path_x)
+        # (skip if X doesn't have coarse sorting)
+        current_hash_x = _spike_labels_hash(spike_labels_path_x)
         if current_hash_x is None:
             continue
         
@@ -299,19 +527,17 @@ def process_unit_matching(bin_files, computed_dir, n_channels, sampling_frequenc
             spike_times_path_y = os.path.join(coarse_sorting_dir_y, "spike_times.npy")
             shifted_path_y = os.path.join(computed_dir, "shifted", fname_y + ".shifted")
             
-            # Skip if Y doesn't have coarse sorting
-            if not os.path.exists(spike_labels_path_y):
-                continue
-            
             # Calculate current hash for Y
-            current_hash_y = calculate_spike_labels_hash(spike_labels_path_y)
+            # (skip if Y doesn't have coarse sorting)
+            current_hash_y = _spike_labels_hash(spike_labels_path_y)
             if current_hash_y is None:
                 continue
             
             # Create output directory for this X-Y pair
             unit_matching_dir = os.path.join(computed_dir, "unit_matching", fname_x, fname_y)
-            if not os.path.exists(unit_matching_dir):
-                os.makedirs(unit_matching_dir)
+            pair_names = _list_names(unit_matching_dir)
+            if len(pair_names) == 0:
+                os.makedirs(unit_matching_dir, exist_ok=True)
             
             # Check if matching already exists and is valid
             metadata_path = os.path.join(unit_matching_dir, "metadata.json")
@@ -321,7 +547,7 @@ def process_unit_matching(bin_files, computed_dir, n_channels, sampling_frequenc
             
             need_recompute = False
             
-            if os.path.exists(metadata_path):
+            if "metadata.json" in pair_names:
                 # Check if hashes match
                 with open(metadata_path, "r") as f:
                     metadata = json.load(f)
@@ -342,9 +568,7 @@ def process_unit_matching(bin_files, computed_dir, n_channels, sampling_frequenc
                     need_recompute = True
                 else:
                     # Hashes match, check if all files exist
-                    if (os.path.exists(mutual_matches_path) and 
-                        os.path.exists(event_matches_x_to_y_path) and 
-                        os.path.exists(event_matches_y_to_x_path)):
+                    if {"mutual_matches.json", "event_matches_x_to_y.npy", "event_matches_y_to_x.npy"} <= pair_names:
                         continue  # Already processed and valid
                     else:
                         need_recompute = True
@@ -360,7 +584,7 @@ def process_unit_matching(bin_files, computed_dir, n_channels, sampling_frequenc
             # Load spike data for X
             spike_labels_x = np.load(spike_labels_path_x)
             spike_times_x = np.load(spike_times_path_x)
-            shifted_data_x = np.fromfile(shifted_path_x, dtype=np.int16).reshape(-1, n_channels)
+            shifted_data_x = np.memmap(shifted_path_x, dtype=np.int16, mode='r').reshape(-1, n_channels)
             
             # Convert spike times to frame indices
             spike_frames_x = (spike_times_x * sampling_frequency).astype(np.int64)
@@ -369,7 +593,7 @@ def process_unit_matching(bin_files, computed_dir, n_channels, sampling_frequenc
             # Load spike data for Y
             spike_labels_y = np.load(spike_labels_path_y)
             spike_times_y = np.load(spike_times_path_y)
-            shifted_data_y = np.fromfile(shifted_path_y, dtype=np.int16).reshape(-1, n_channels)
+            shifted_data_y = np.memmap(shifted_path_y, dtype=np.int16, mode='r').reshape(-1, n_channels)
             
             # Convert spike times to frame indices
             spike_frames_y = (spike_times_y * sampling_frequency).astype(np.int64)
@@ -408,33 +632,44 @@ def process_unit_matching(bin_files, computed_dir, n_channels, sampling_frequenc
     return something_processed
 
 def process_preview(bin_files, computed_dir, n_channels, sampling_frequency, electrode_coords):
+    preview_dir = os.path.join(computed_dir, "preview")
+    preview_names = _list_names(preview_dir)
+    filt_keys = _StageKeys(os.path.join(computed_dir, "filt"))
+    shifted_keys = _StageKeys(os.path.join(computed_dir, "shifted"))
+    high_activity_keys = _StageKeys(os.path.join(computed_dir, "high_activity"))
+    stats_keys = _StageKeys(os.path.join(computed_dir, "stats"))
+    coarse_sorting_keys = _StageKeys(os.path.join(computed_dir, "coarse_sorting"))
+    preview_keys = _StageKeys(preview_dir)
+    params = {"n_channels": n_channels, "sampling_frequency": sampling_frequency}
+    expected_keys = {
+        fname + ".figpack": _stage_key(
+            params,
+            filt_keys.get(fname + ".filt"),
+            shifted_keys.get(fname + ".shifted"),
+            high_activity_keys.get(fname + ".high_activity.json"),
+            stats_keys.get(fname + ".stats.json"),
+            coarse_sorting_keys.get(fname)
+        )
+        for fname in bin_files
+    }
+    preview_keys.adopt(expected_keys, preview_names)
     for fname in bin_files:
         filt_path = os.path.join(computed_dir, "filt", fname + ".filt")
         shift_path = os.path.join(computed_dir, "shifted", fname + ".shifted")
         high_activity_intervals_path = os.path.join(computed_dir, "high_activity", fname + ".high_activity.json")
         stats_path = os.path.join(computed_dir, "stats", fname + ".stats.json")
         coarse_sorting_path = os.path.join(computed_dir, "coarse_sorting", fname)
-        if not os.path.exists(os.path.join(computed_dir, "preview")):
-            os.makedirs(os.path.join(computed_dir, "preview"))
-        preview_path = os.path.join(computed_dir, "preview", fname + ".figpack")
-        if os.path.exists(preview_path):
+        preview_path = os.path.join(preview_dir, fname + ".figpack")
+        key = expected_keys[fname + ".figpack"]
+        if key is None:
+            continue  # Filtered, shifted, high activity, stats or coarse sorting outputs do not exist yet
+        if preview_keys.is_current(fname + ".figpack", key):
             continue  # Already processed
-        if not os.path.exists(filt_path):
-            continue  # Filtered file does not exist yet
-        if not os.path.exists(shift_path):
-            continue  # Shifted file does not exist yet
-        if not os.path.exists(high_activity_intervals_path):
-            continue  # High activity intervals do not exist yet
-        if not os.path.exists(stats_path):
-            continue  # Stats file does not exist yet
-        if not os.path.exists(coarse_sorting_path):
-            continue  # Coarse sorting does not exist yet
-
-        with open(high_activity_intervals_path, "r") as f:
-            high_activity_data = json.load(f)
-        high_activity_intervals = [
-            (item['start_sec'], item['end_sec']) for item in high_activity_data['high_activity_intervals']
-        ]
+        if fname + ".figpack" in preview_names:
+            print(f"Preview {preview_path} is out of date, regenerating.")
+            shutil.rmtree(preview_path)
+
+        high_activity_intervals = _load_high_activity_intervals(high_activity_intervals_path)
         print(f"Generating preview figpack: {fname}.figpack")
         generate_preview(
             filt_path=filt_path,
@@ -447,5 +682,6 @@ def process_preview(bin_files, computed_dir, n_channels, sampling_frequency, ele
             electrode_coords=electrode_coords,
             preview_path=preview_path
         )
+        preview_keys.set(fname + ".figpack", key)
         return True
     return False
@@ -1,4 +1,8 @@
 import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import requests
 import yaml
 
@@ -16,9 +20,7 @@ def download_simulated_data(use_acquisition_folder: bool):
         coords_filepath = os.path.join(os.getcwd(), "electrode_coords.txt")
         if not os.path.exists(coords_filepath):
             print(f"Downloading electrode coordinates from {electrode_coords_url} to {coords_filepath}...")
-            response = requests.get(electrode_coords_url)
-            with open(coords_filepath, "wb") as f:
-                f.write(response.content)
+            _download_file(electrode_coords_url, coords_filepath)
         else:
             print(f"Electrode coordinates file {coords_filepath} already exists. Skipping download.")
     
@@ -29,18 +31,59 @@ def download_simulated_data(use_acquisition_folder: bool):
     if not os.path.exists(target_dir):
         os.makedirs(target_dir)
     
+    downloads = []
     for i in range(len(raw_data_urls)):
         url = raw_data_urls[i]
         filename = f"simulated_{i+1:04d}.bin"
         filepath = os.path.join(target_dir, filename)
         if not os.path.exists(filepath):
-            print(f"Downloading simulated raw data from {url} to {filepath}...")
-            response = requests.get(url)
-            with open(filepath, "wb") as f:
-                f.write(response.content)
+            downloads.append((url, filepath))
         else:
             print(f"Simulated raw data file {filepath} already exists. Skipping download.")
 
+    # Download the files concurrently (the time is mostly spent waiting on
+    # the network), each worker thread reusing its own HTTP session
+    def download(url, filepath):
+        print(f"Downloading simulated raw data from {url} to {filepath}...")
+        _download_file(url, filepath, session=_get_thread_session())
+
+    if len(downloads) > 0:
+        with ThreadPoolExecutor(max_workers=min(8, len(downloads))) as executor:
+            futures = [executor.submit(download, url, filepath) for url, filepath in downloads]
+            for future in futures:
+                future.result()
+
+_thread_local = threading.local()
+
+def _get_thread_session():
+    """Return a requests.Session for the current thread (for connection reuse)."""
+    session = getattr(_thread_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        _thread_local.session = session
+    return session
+
+def _download_file(url, filepath, session=None):
+    """
+    Stream a URL to filepath in 1 MiB pieces (so the file is never held in
+    memory). The data is written to a temporary file that is renamed when
+    complete, so an interrupted download is not mistaken for a finished one.
+    """
+    get = session.get if session is not None else requests.get
+    tmp_filepath = filepath + ".download"
+    try:
+        with get(url, stream=True, timeout=(5, 60)) as response:
+            response.raise_for_status()
+            # Undo any Content-Encoding, as response.content would
+            response.raw.decode_content = True
+            with open(tmp_filepath, "wb") as f:
+                shutil.copyfileobj(response.raw, f, length=1 << 20)
+        os.replace(tmp_filepath, filepath)
+    except BaseException:
+        if os.path.exists(tmp_filepath):
+            os.remove(tmp_filepath)
+        raise
+
 def load_electrode_coords(n_channels):
     """Load and validate electrode coordinates from electrode_coords.txt."""
     coords_path = os.path.join(os.getcwd(), "electrode_coords.txt")
@@ -52,14 +95,22 @@ def load_electrode_coords(n_channels):
     
     print("Found electrode_coords.txt file.")
     
-    electrode_coords = []
-    with open(coords_path, "r") as f:
-        for line in f:
-            parts = line.strip().split()
-            if len(parts) != 2:
-                continue
-            x, y = float(parts[0]), float(parts[1])
-            electrode_coords.append((x, y))
+    # Parse as an (n, 2) array in one call; fall back to reading line by
+    # line (skipping lines that are not X Y pairs) if the file is irregular
+    try:
+        electrode_coords = np.loadtxt(coords_path, dtype=np.float64, ndmin=2)
+        if electrode_coords.shape[1] != 2:
+            raise ValueError("expected two columns")
+    except ValueError:
+        electrode_coords = []
+        with open(coords_path, "r") as f:
+            for line in f:
+                parts = line.strip().split()
+                if len(parts) != 2:
+                    continue
+                x, y = float(parts[0]), float(parts[1])
+                electrode_coords.append((x, y))
+        electrode_coords = np.array(electrode_coords, dtype=np.float64).reshape(-1, 2)
     
     if len(electrode_coords) != n_channels:
         print(
@@ -75,6 +126,7 @@ def setup_directories(use_acquisition_folder: bool):
     
     If use_acquisition_folder is True: creates acquisition/, raw/, and computed/
     If use_acquisition_folder is False: creates only raw/ and computed/
+    computed/ also gets the output subdirectories of the processing stages
     """
     acquisition_dir = None
     if use_acquisition_folder:
@@ -102,4 +154,8 @@ def setup_directories(use_acquisition_folder: bool):
     else:
         print("Found existing computed/ directory.")
     
+    # Output directories of the processing stages
+    for subdir in ("filt", "high_activity", "stats", "shifted", "coarse_sorting", "preview"):
+        os.makedirs(os.path.join(computed_dir, subdir), exist_ok=True)
+    
     return acquisition_dir, raw_dir, computed_dir
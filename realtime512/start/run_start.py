@@ -1,11 +1,17 @@
 import os
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 from .build_utils import build_ui_components, BuildError
 from .config_utils import check_or_create_config, load_and_validate_config
 from .file_setup import download_simulated_data, load_electrode_coords, setup_directories
 from .acquisition_processor import AcquisitionProcessor
+from .change_watcher import ChangeWatcher
+
+# Suffixes of files in raw/ that are still being written by realtime512
+# (raw chunks from the acquisition processor, downloads)
+_PARTIAL_FILE_SUFFIXES = (".part", ".download")
 
 def run_start():
     """Main entry point for realtime512 processing."""
@@ -27,6 +33,7 @@ def run_start():
     
     # Import these after building UI
     from .file_processors import (
+        check_filtered_files,
         process_filtering,
         estimate_shift_coefficients,
         load_shift_coefficients,
@@ -55,6 +62,7 @@ def run_start():
     course_sorting_detect_threshold = config.get('coarse_sorting_detect_threshold')
     use_acquisition_folder = config.get('use_acquisition_folder', False)
     raw_chunk_duration_sec = config.get('raw_chunk_duration_sec', 10.0)
+    drop_acquisition_cache = config.get('drop_acquisition_cache', False)
 
     # Download simulated data if configured
     download_simulated_data(use_acquisition_folder)
@@ -76,7 +84,8 @@ def run_start():
             computed_dir=computed_dir,
             n_channels=n_channels,
             sampling_frequency=sampling_frequency,
-            chunk_duration_sec=raw_chunk_duration_sec
+            chunk_duration_sec=raw_chunk_duration_sec,
+            drop_acquisition_cache=drop_acquisition_cache
         )
         print(f"Acquisition mode enabled: rechunking to {raw_chunk_duration_sec}s chunks")
 
@@ -91,6 +100,24 @@ def run_start():
         print(f"Waiting for .bin file to appear in {wait_dir_name}/ directory...")
         time.sleep(5)
     
+    # The stages that only depend on the filtered data (high activity
+    # intervals, spike stats and time shifts) are run concurrently. Threads
+    # are used because their heavy parts (NumPy and compiled kernels) release
+    # the GIL, and the time shift stage may prompt for input.
+    stage_executor = ThreadPoolExecutor(max_workers=3)
+
+    # Filtering (reading raw/ and writing filt/) runs on its own thread for
+    # the whole pass, so it overlaps with the stages downstream of it. Those
+    # only see a filtered file once it is complete and its key is recorded.
+    filter_executor = ThreadPoolExecutor(max_workers=1)
+
+    # Wake up on new data files (and focus unit changes in the experiment
+    # directory) instead of polling when everything is up to date
+    watched_dirs = [os.getcwd(), raw_dir]
+    if use_acquisition_folder:
+        watched_dirs.append(acquisition_dir)
+    change_watcher = ChangeWatcher(watched_dirs, poll_interval_sec=5)
+
     # Main processing loop
     up_to_date_has_been_printed = False
     while True:
@@ -100,27 +127,35 @@ def run_start():
                 up_to_date_has_been_printed = False
 
         # Get list of all .bin files in raw/
-        bin_files = [
-            fname for fname in os.listdir(raw_dir) #if fname.endswith(".bin")
-        ]
+        # Files written by realtime512 itself have a temporary suffix until
+        # they are complete. In acquisition mode only those are in raw/; otherwise
+        # only consider files that have not been modified in the last 5
+        # seconds to avoid processing files that are still being written
+        now = time.time()
+        with os.scandir(raw_dir) as entries:
+            bin_files = [
+                entry.name for entry in entries #if entry.name.endswith(".bin")
+                if not entry.name.endswith(_PARTIAL_FILE_SUFFIXES)
+                and (use_acquisition_folder or now - entry.stat().st_mtime > 5)
+            ]
         # reverse the order so that newer files are processed first
         bin_files.sort(reverse=True)
-        
-        # Only consider files that have not been modified in the last 5 seconds
-        # to avoid processing files that are still being written
-        bin_files = [
-            fname for fname in bin_files
-            if time.time() - os.path.getmtime(os.path.join(raw_dir, fname)) > 5
-        ]
 
         something_processed = False
 
         # Process filtering
-        if process_filtering(
-            bin_files, raw_dir, computed_dir, n_channels, 
+        # Key adoption and size-mismatch prompts happen here on the main
+        # thread, so the downstream stages see the filt keys and no prompt
+        # runs concurrently with the one in process_time_shifts
+        check_filtered_files(
+            bin_files, raw_dir, computed_dir, n_channels,
             filter_params, sampling_frequency
-        ):
-            something_processed = True
+        )
+        filter_future = filter_executor.submit(
+            process_filtering,
+            bin_files, raw_dir, computed_dir, n_channels,
+            filter_params, sampling_frequency
+        )
 
         # Estimate shift coefficients
         if estimate_shift_coefficients(
@@ -131,25 +166,28 @@ def run_start():
         # Load shift coefficients
         c_x, c_y = load_shift_coefficients(computed_dir)
 
-        # Compute high activity intervals
-        if process_high_activity_intervals(
-            bin_files, computed_dir, n_channels, sampling_frequency, high_activity_threshold
-        ):
-            something_processed = True
-
-        # Compute spike stats
-        if process_spike_stats(
-            bin_files, computed_dir, n_channels,
-            sampling_frequency, detect_threshold_for_spike_stats
-        ):
-            something_processed = True
-
-        # Apply time shifts
-        if process_time_shifts(
-            bin_files, computed_dir, n_channels, sampling_frequency,
-            c_x, c_y, electrode_coords
-        ):
-            something_processed = True
+        filt_stage_futures = [
+            # Compute high activity intervals
+            stage_executor.submit(
+                process_high_activity_intervals,
+                bin_files, computed_dir, n_channels, sampling_frequency, high_activity_threshold
+            ),
+            # Compute spike stats
+            stage_executor.submit(
+                process_spike_stats,
+                bin_files, computed_dir, n_channels,
+                sampling_frequency, detect_threshold_for_spike_stats
+            ),
+            # Apply time shifts
+            stage_executor.submit(
+                process_time_shifts,
+                bin_files, computed_dir, n_channels, sampling_frequency,
+                c_x, c_y, electrode_coords
+            ),
+        ]
+        for future in filt_stage_futures:
+            if future.result():
+                something_processed = True
 
         # Perform coarse sorting
         if process_coarse_sorting(
@@ -169,11 +207,14 @@ def run_start():
         ):
             something_processed = True
 
+        if filter_future.result():
+            something_processed = True
+
         if something_processed:
             up_to_date_has_been_printed = False
         else:
             if not up_to_date_has_been_printed:
                 print("All files are up to date.")
                 up_to_date_has_been_printed = True
-            # only sleep if nothing was processed
-            time.sleep(5)
+            # only wait if nothing was processed
+            change_watcher.wait()